@@ -1,7 +1,14 @@
 import os
+import time
+import queue
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import orjson
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -12,20 +19,66 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster response serialization"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.json = OrjsonProvider(app)
+
+# Uploads larger than Werkzeug's in-memory threshold are spooled to temp files;
+# non-file fields (e.g. base64 camera captures) still have to fit in memory
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+app.config["MAX_FORM_MEMORY_SIZE"] = 16 * 1024 * 1024
 
-# Configure logging
+# Configure logging; handlers run on a background listener so request threads only enqueue records
 logging.basicConfig(level=logging.DEBUG)
+_root_logger = logging.getLogger()
+_log_queue = queue.Queue(-1)
+log_listener = QueueListener(_log_queue, *_root_logger.handlers, respect_handler_level=True)
+_root_logger.handlers = [QueueHandler(_log_queue)]
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///assistant.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # SQLite connections are local files; Flask-SQLAlchemy picks a suitable pool
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_pre_ping": True,
+    }
+else:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    }
+
+# Log slow queries so regressions are visible
+SLOW_QUERY_SECONDS = 0.1
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    if elapsed > SLOW_QUERY_SECONDS:
+        logging.warning(f"Slow query ({elapsed * 1000:.0f} ms): {statement}")
 
 # Initialize the app with the extension
 db.init_app(app)
@@ -43,6 +96,7 @@ with app.app_context():
     
     # Create all tables
     db.create_all()
+    models.ensure_schema()
     
     # Import and register routes
     from routes.main_routes import main_bp
@@ -1,56 +1,173 @@
+import logging
 from app import db
 from datetime import datetime
-from sqlalchemy import Text
-
-class CommandHistory(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    command_text = db.Column(Text, nullable=False)
-    command_type = db.Column(db.String(50), nullable=False)
-    status = db.Column(db.String(20), default='pending')
-    result = db.Column(Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    completed_at = db.Column(db.DateTime)
-    
-    def __init__(self, command_text, command_type, status='pending', result=None):
-        self.command_text = command_text
-        self.command_type = command_type
-        self.status = status
-        self.result = result
-
-class AutoReplyLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    platform = db.Column(db.String(20), nullable=False)  # email, whatsapp
-    sender = db.Column(db.String(255), nullable=False)
-    original_message = db.Column(Text, nullable=False)
-    reply_message = db.Column(Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='sent')
-    
-    def __init__(self, platform, sender, original_message, reply_message, status='sent'):
-        self.platform = platform
-        self.sender = sender
-        self.original_message = original_message
-        self.reply_message = reply_message
-        self.status = status
-
-class SocialMediaPost(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    platform = db.Column(db.String(20), nullable=False)  # facebook
-    content = db.Column(Text, nullable=False)
-    image_path = db.Column(db.String(255))
-    post_id = db.Column(db.String(255))
-    status = db.Column(db.String(20), default='posted')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __init__(self, platform, content, image_path=None, post_id=None, status='posted'):
-        self.platform = platform
-        self.content = content
-        self.image_path = image_path
-        self.post_id = post_id
-        self.status = status
-
-class Settings(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(100), unique=True, nullable=False)
-    value = db.Column(Text)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+from enum import StrEnum
+from typing import Optional
+from sqlalchemy import SmallInteger, String, Text, func, inspect, select, text
+from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column
+from sqlalchemy.types import TypeDecorator
+
+# Low-cardinality columns are stored as small integer codes: a member's code is
+# its position in the enum, so new members must only ever be appended.
+class CommandStatus(StrEnum):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+class DeliveryStatus(StrEnum):
+    SENT = 'sent'
+    POSTED = 'posted'
+    FAILED = 'failed'
+
+class Platform(StrEnum):
+    EMAIL = 'email'
+    WHATSAPP = 'whatsapp'
+    FACEBOOK = 'facebook'
+
+class CodedEnum(TypeDecorator):
+    """Persist a StrEnum as a SmallInteger code while exposing enum members to Python"""
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+        self._members = tuple(enum_class)
+        self._codes = {member: code for code, member in enumerate(self._members)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self._codes[self.enum_class(value)]
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # SQLite keeps codes as text in columns created before the conversion
+            if value.isdigit():
+                return self._members[int(value)]
+            try:
+                return self.enum_class(value)
+            except ValueError:
+                return value
+        return self._members[value]
+
+class CommandHistory(MappedAsDataclass, db.Model):
+    __mapper_args__ = {"eager_defaults": True}
+    
+    id: Mapped[int] = mapped_column(primary_key=True, init=False)
+    command_text: Mapped[str] = mapped_column(Text)
+    command_type: Mapped[str] = mapped_column(String(50), index=True)
+    status: Mapped[Optional[CommandStatus]] = mapped_column(CodedEnum(CommandStatus), default=CommandStatus.PENDING, index=True)
+    result: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    created_at: Mapped[Optional[datetime]] = mapped_column(insert_default=datetime.utcnow, index=True, init=False)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(default=None, init=False)
+
+class AutoReplyLog(MappedAsDataclass, db.Model):
+    __table_args__ = (db.Index('ix_autoreply_platform_created', 'platform', 'created_at'),)
+    __mapper_args__ = {"eager_defaults": True}
+    
+    id: Mapped[int] = mapped_column(primary_key=True, init=False)
+    platform: Mapped[Platform] = mapped_column(CodedEnum(Platform))  # email, whatsapp
+    sender: Mapped[str] = mapped_column(String(255))
+    original_message: Mapped[str] = mapped_column(Text)
+    reply_message: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(insert_default=datetime.utcnow, index=True, init=False)
+    status: Mapped[Optional[DeliveryStatus]] = mapped_column(CodedEnum(DeliveryStatus), default=DeliveryStatus.SENT, index=True)
+
+class SocialMediaPost(MappedAsDataclass, db.Model):
+    __table_args__ = (db.Index('ix_socialpost_platform_created', 'platform', 'created_at'),)
+    __mapper_args__ = {"eager_defaults": True}
+    
+    id: Mapped[int] = mapped_column(primary_key=True, init=False)
+    platform: Mapped[Platform] = mapped_column(CodedEnum(Platform))  # facebook
+    content: Mapped[str] = mapped_column(Text)
+    image_path: Mapped[Optional[str]] = mapped_column(String(255), default=None)
+    post_id: Mapped[Optional[str]] = mapped_column(String(255), default=None)
+    status: Mapped[Optional[DeliveryStatus]] = mapped_column(CodedEnum(DeliveryStatus), default=DeliveryStatus.POSTED, index=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(insert_default=datetime.utcnow, index=True, init=False)
+
+class Settings(MappedAsDataclass, db.Model):
+    __mapper_args__ = {"eager_defaults": True}
+    
+    id: Mapped[int] = mapped_column(primary_key=True, init=False)
+    key: Mapped[str] = mapped_column(String(100), unique=True)
+    value: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(insert_default=datetime.utcnow, init=False)
+
+def activity_counts_since(since):
+    """Count commands, auto-replies and posts created since the given time in one query"""
+    def _count(model):
+        return select(func.count()).select_from(model).where(model.created_at >= since).scalar_subquery()
+
+    return db.session.execute(select(
+        _count(CommandHistory),
+        _count(AutoReplyLog),
+        _count(SocialMediaPost)
+    )).one()
+
+_CODED_COLUMNS = (
+    ('command_history', 'status', CommandStatus),
+    ('auto_reply_log', 'platform', Platform),
+    ('auto_reply_log', 'status', DeliveryStatus),
+    ('social_media_post', 'platform', Platform),
+    ('social_media_post', 'status', DeliveryStatus),
+)
+
+def _convert_coded_columns():
+    """Rewrite status/platform strings left by the old VARCHAR schema as integer codes
+    
+    Values that match no enum member would have no code to map to, so the migration is
+    aborted with those values listed instead of guessing one.
+    """
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect.name
+    
+    with db.engine.begin() as conn:
+        # Columns still holding strings, with the SQL that picks out their string rows
+        pending = []
+        for table, column, enum_class in _CODED_COLUMNS:
+            if dialect == 'sqlite':
+                # SQLite cannot change a column type; the codes are stored in place
+                pending.append((table, column, enum_class, f"{column} NOT GLOB '[0-9]*'"))
+                continue
+            
+            column_type = next(c['type'] for c in inspector.get_columns(table) if c['name'] == column)
+            if not isinstance(column_type, String):
+                continue
+            if dialect == 'postgresql':
+                pending.append((table, column, enum_class, "TRUE"))
+            else:
+                logging.warning(f"{table}.{column} still uses the old string schema; convert it manually")
+        
+        unknown = []
+        for table, column, enum_class, is_string in pending:
+            known = ", ".join(f"'{member.value}'" for member in enum_class)
+            values = conn.execute(text(
+                f"SELECT DISTINCT {column} FROM {table} WHERE {is_string} AND {column} NOT IN ({known})"
+            )).scalars().all()
+            unknown.extend(f"{table}.{column}={value!r}" for value in values)
+        if unknown:
+            raise RuntimeError(f"Cannot convert values with no matching code: {', '.join(unknown)}; "
+                               f"fix or remove these rows and restart")
+        
+        for table, column, enum_class, is_string in pending:
+            # NULLs stay NULL; every other value is known to match a member
+            cases = " ".join(f"WHEN '{member.value}' THEN {code}" for code, member in enumerate(enum_class))
+            to_code = f"CASE {column} {cases} END"
+            
+            if dialect == 'sqlite':
+                conn.execute(text(f"UPDATE {table} SET {column} = {to_code} WHERE {is_string}"))
+            else:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE SMALLINT USING {to_code}"))
+                logging.info(f"Converted {table}.{column} to integer codes")
+
+def ensure_schema():
+    """Bring tables that predate the current models up to date (create_all skips existing tables)"""
+    _convert_coded_columns()
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -1,10 +1,116 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, current_app, request, jsonify, send_from_directory
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
+from werkzeug.security import safe_join
 import logging
 import os
+import math
+import threading
+import time
+import orjson
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import raiseload
+from app import db
+from models import CommandHistory, AutoReplyLog, activity_counts_since
+from services.command_processor import command_processor
+from services.email_service import email_service
+from services.facebook_service import get_facebook_service
+from services.file_processor import detect_language, file_processor
+from services.gemini_service import gemini_service
+from services.text_ai_service import text_ai_service
+from services.voice_service import voice_service
 
 api_bp = Blueprint('api', __name__)
 
+GENERATED_IMAGES_DIR = 'static/generated_images'
+PROVIDER_STATUS_TTL = 60  # seconds
+
+# Encoded system_status payloads keyed by day
+_status_cache = TTLCache(maxsize=4, ttl=3)
+_status_lock = threading.Lock()
+
+# Shared pool for decoding/extracting chat attachments
+_attachment_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='attachment')
+
+_COMMAND_HISTORY_COLUMNS = (
+    CommandHistory.id,
+    CommandHistory.command_text,
+    CommandHistory.command_type,
+    CommandHistory.status,
+    CommandHistory.result,
+    CommandHistory.created_at,
+    CommandHistory.completed_at,
+)
+
+# Settings form fields and the environment variables they update
+_ENV_MAPPINGS = MappingProxyType({
+    # AI Text/Chat APIs
+    'gemini_api_key': 'GEMINI_API_KEY',
+    'huggingface_api_key': 'HUGGINGFACE_API_KEY',
+    'aiml_api_key': 'AIML_API_KEY',
+    'openai_api_key': 'OPENAI_API_KEY',
+    
+    # Image Generation APIs
+    'deepai_api_key': 'DEEPAI_API_KEY',
+    'replicate_api_key': 'REPLICATE_API_KEY',
+    'stability_api_key': 'STABILITY_API_KEY',
+    
+    # TTS/Voice APIs
+    'elevenlabs_api_key': 'ELEVENLABS_API_KEY',
+    'assembly_api_key': 'ASSEMBLY_API_KEY',
+    
+    # Social Media APIs
+    'facebook_access_token': 'FACEBOOK_ACCESS_TOKEN',
+    'facebook_page_id': 'FACEBOOK_PAGE_ID',
+    
+    # Communication APIs
+    'gmail_client_id': 'GMAIL_CLIENT_ID',
+    'gmail_client_secret': 'GMAIL_CLIENT_SECRET',
+    'whatsapp_token': 'WHATSAPP_TOKEN',
+    'whatsapp_verify_token': 'WHATSAPP_VERIFY_TOKEN'
+})
+
+# langdetect codes to the language names used in prompts
+_LANG_MAP = MappingProxyType({
+    'en': 'english',
+    'ur': 'urdu',
+    'ar': 'arabic',
+    'hi': 'hindi',
+    'es': 'spanish',
+    'fr': 'french'
+})
+
+# Capability note appended to every chat prompt, prebuilt per response language
+_CAPABILITY_SUFFIX = MappingProxyType({
+    language: (
+        f"\n\nPlease respond in {language}. You are an AI assistant with access to:"
+        "\n- File analysis (documents, images, spreadsheets, archives)"
+        "\n- Computer vision and OpenCV image processing"
+        "\n- Text generation and content creation"
+        "\n- Multi-language support"
+        "\nProvide helpful, accurate responses based on the user's input and any attached content."
+    )
+    for language in _LANG_MAP.values()
+})
+
+@lru_cache(maxsize=8192)
+def _detect_language(text):
+    """Detect language code of a message, cached since langdetect is slow"""
+    return detect_language(text)
+
+@api_bp.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """JSON 413 for bodies over MAX_CONTENT_LENGTH instead of Werkzeug's HTML page"""
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({
+        'success': False,
+        'error': f'Request too large; uploads are limited to {limit_mb} MB'
+    }), 413
+
 @api_bp.route('/process-command', methods=['POST'])
 def process_command():
     """Process voice command"""
@@ -18,7 +124,6 @@ def process_command():
                 'error': 'No command provided'
             }), 400
         
-        from services.command_processor import command_processor
         result = command_processor.process_command(command_text)
         
         return jsonify(result)
@@ -37,7 +142,6 @@ def voice_test():
         data = request.get_json()
         text = data.get('text', 'This is a voice test')
         
-        from services.voice_service import voice_service
         success = voice_service.speak(text)
         
         return jsonify({
@@ -52,45 +156,55 @@ def voice_test():
             'error': str(e)
         }), 500
 
+def _build_system_status(today):
+    """Collect today's counters and recent activity for system_status"""
+    # Get today's statistics in a single round trip
+    commands_today, replies_today, posts_today = activity_counts_since(today)
+    
+    # Get recent activities
+    recent_commands = CommandHistory.query.options(raiseload('*'))\
+                                          .order_by(CommandHistory.created_at.desc()).limit(5).all()
+    recent_replies = AutoReplyLog.query.options(raiseload('*'))\
+                                       .order_by(AutoReplyLog.created_at.desc()).limit(5).all()
+    
+    return {
+        'success': True,
+        'status': {
+            'commands_today': commands_today,
+            'replies_today': replies_today,
+            'posts_today': posts_today,
+            'recent_commands': [{
+                'id': cmd.id,
+                'command_text': cmd.command_text,
+                'command_type': cmd.command_type,
+                'status': cmd.status,
+                'created_at': cmd.created_at
+            } for cmd in recent_commands],
+            'recent_replies': [{
+                'id': reply.id,
+                'platform': reply.platform,
+                'sender': reply.sender,
+                'status': reply.status,
+                'created_at': reply.created_at
+            } for reply in recent_replies]
+        }
+    }
+
 @api_bp.route('/system-status', methods=['GET'])
 def system_status():
     """Get system status"""
     try:
-        from models import CommandHistory, AutoReplyLog, SocialMediaPost
-        
-        # Get today's statistics
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0)
-        
-        commands_today = CommandHistory.query.filter(CommandHistory.created_at >= today).count()
-        replies_today = AutoReplyLog.query.filter(AutoReplyLog.created_at >= today).count()
-        posts_today = SocialMediaPost.query.filter(SocialMediaPost.created_at >= today).count()
-        
-        # Get recent activities
-        recent_commands = CommandHistory.query.order_by(CommandHistory.created_at.desc()).limit(5).all()
-        recent_replies = AutoReplyLog.query.order_by(AutoReplyLog.created_at.desc()).limit(5).all()
-        
-        return jsonify({
-            'success': True,
-            'status': {
-                'commands_today': commands_today,
-                'replies_today': replies_today,
-                'posts_today': posts_today,
-                'recent_commands': [{
-                    'id': cmd.id,
-                    'command_text': cmd.command_text,
-                    'command_type': cmd.command_type,
-                    'status': cmd.status,
-                    'created_at': cmd.created_at.isoformat()
-                } for cmd in recent_commands],
-                'recent_replies': [{
-                    'id': reply.id,
-                    'platform': reply.platform,
-                    'sender': reply.sender,
-                    'status': reply.status,
-                    'created_at': reply.created_at.isoformat()
-                } for reply in recent_replies]
-            }
-        })
+        # Dashboards poll this endpoint; reuse the encoded payload for a few seconds
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        body = _status_cache.get(today)
+        if body is None:
+            with _status_lock:
+                body = _status_cache.get(today)
+                if body is None:
+                    body = orjson.dumps(_build_system_status(today))
+                    _status_cache[today] = body
+        
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logging.error(f"Error getting system status: {e}")
@@ -103,8 +217,6 @@ def system_status():
 def manual_auto_reply():
     """Manually trigger auto-reply processing"""
     try:
-        from services.email_service import email_service
-        
         # Process email auto-replies
         processed_emails = email_service.process_auto_replies()
         
@@ -135,8 +247,7 @@ def create_facebook_post():
                 'error': 'Topic is required'
             }), 400
         
-        from services.facebook_service import facebook_service
-        success, result = facebook_service.create_post_with_ai_content(topic, include_image)
+        success, result = get_facebook_service().create_post_with_ai_content(topic, include_image)
         
         if success:
             return jsonify({
@@ -173,12 +284,9 @@ def generate_image():
         # Generate filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"api_generated_{timestamp}.png"
-        image_path = f"static/generated_images/{filename}"
+        image_path = f"{GENERATED_IMAGES_DIR}/{filename}"
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-        
-        from services.gemini_service import gemini_service
+        # generate_image creates the directory if needed
         success, result = gemini_service.generate_image(prompt, image_path)
         
         if success:
@@ -205,30 +313,58 @@ def generate_image():
 def command_history():
     """Get command history"""
     try:
-        from models import CommandHistory
-        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        cursor_id = request.args.get('cursor_id', type=int)
+        if page < 1:
+            page = 1
+        if per_page < 1:
+            per_page = 20
+        
+        # Plain row mappings skip ORM object construction for a read-only listing.
+        # One extra row tells whether another page follows.
+        stmt = select(*_COMMAND_HISTORY_COLUMNS)\
+            .order_by(CommandHistory.created_at.desc(), CommandHistory.id.desc())\
+            .limit(per_page + 1)
+        
+        if cursor:
+            # Keyset pagination: continue after the last row of the previous page
+            try:
+                cursor_dt = datetime.fromisoformat(cursor)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid cursor'
+                }), 400
+            
+            if cursor_id is None:
+                stmt = stmt.where(CommandHistory.created_at < cursor_dt)
+            else:
+                stmt = stmt.where(tuple_(CommandHistory.created_at, CommandHistory.id) < (cursor_dt, cursor_id))
+        else:
+            stmt = stmt.offset((page - 1) * per_page)
+        
+        commands = [dict(row) for row in db.session.execute(stmt).mappings()]
+        next_cursor = None
+        if len(commands) > per_page:
+            commands = commands[:per_page]
+            next_cursor = {
+                'cursor': commands[-1]['created_at'],
+                'cursor_id': commands[-1]['id']
+            }
         
-        commands = CommandHistory.query.order_by(CommandHistory.created_at.desc())\
-                                      .paginate(page=page, per_page=per_page, error_out=False)
+        total = db.session.scalar(select(func.count()).select_from(CommandHistory))
         
         return jsonify({
             'success': True,
-            'commands': [{
-                'id': cmd.id,
-                'command_text': cmd.command_text,
-                'command_type': cmd.command_type,
-                'status': cmd.status,
-                'result': cmd.result,
-                'created_at': cmd.created_at.isoformat(),
-                'completed_at': cmd.completed_at.isoformat() if cmd.completed_at else None
-            } for cmd in commands.items],
+            'commands': commands,
             'pagination': {
-                'page': commands.page,
-                'pages': commands.pages,
-                'per_page': commands.per_page,
-                'total': commands.total
+                'page': None if cursor else page,
+                'pages': math.ceil(total / per_page),
+                'per_page': per_page,
+                'total': total,
+                'next_cursor': next_cursor
             }
         })
         
@@ -243,16 +379,25 @@ def command_history():
 def download_image(filename):
     """Download generated image"""
     try:
-        image_path = f"static/generated_images/{filename}"
-        
-        if os.path.exists(image_path):
-            return send_file(image_path, as_attachment=True)
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Image not found'
-            }), 404
-            
+        accel_prefix = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+        if accel_prefix:
+            # Let nginx serve the file itself from its internal location
+            internal_path = safe_join(accel_prefix, filename)
+            if internal_path is None:
+                raise NotFound()
+            response = Response(status=200)
+            response.headers['X-Accel-Redirect'] = internal_path
+            response.headers['Content-Disposition'] = f'attachment; filename="{os.path.basename(filename)}"'
+            del response.headers['Content-Type']
+            return response
+        
+        return send_from_directory(GENERATED_IMAGES_DIR, filename, as_attachment=True, conditional=True)
+        
+    except NotFound:
+        return jsonify({
+            'success': False,
+            'error': 'Image not found'
+        }), 404
     except Exception as e:
         logging.error(f"Error downloading image: {e}")
         return jsonify({
@@ -264,8 +409,6 @@ def download_image(filename):
 def generate_text():
     """Generate text content using AI"""
     try:
-        from services.text_ai_service import text_ai_service
-        
         data = request.get_json()
         content_type = data.get('content_type', 'social_post')
         topic = data.get('topic', '').strip()
@@ -297,17 +440,27 @@ def generate_text():
             'error': str(e)
         }), 500
 
+@lru_cache(maxsize=1)
+def _content_types_body():
+    """Encoded content-types payload; the templates never change at runtime"""
+    return orjson.dumps({
+        'success': True,
+        'content_types': text_ai_service.get_available_content_types()
+    })
+
+@lru_cache(maxsize=1)
+def _provider_status_body():
+    """Build time and encoded provider status payload; cleared when API keys change"""
+    return time.monotonic(), orjson.dumps({
+        'success': True,
+        'providers': text_ai_service.get_provider_status()
+    })
+
 @api_bp.route('/content-types', methods=['GET'])
 def get_content_types():
     """Get available content types"""
     try:
-        from services.text_ai_service import text_ai_service
-        
-        content_types = text_ai_service.get_available_content_types()
-        return jsonify({
-            'success': True,
-            'content_types': content_types
-        })
+        return Response(_content_types_body(), mimetype='application/json')
         
     except Exception as e:
         logging.error(f"Error getting content types: {e}")
@@ -320,13 +473,12 @@ def get_content_types():
 def get_ai_provider_status():
     """Get AI provider availability status"""
     try:
-        from services.text_ai_service import text_ai_service
+        built_at, body = _provider_status_body()
+        if time.monotonic() - built_at >= PROVIDER_STATUS_TTL:
+            _provider_status_body.cache_clear()
+            built_at, body = _provider_status_body()
         
-        status = text_ai_service.get_provider_status()
-        return jsonify({
-            'success': True,
-            'providers': status
-        })
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logging.error(f"Error getting provider status: {e}")
@@ -339,66 +491,66 @@ def get_ai_provider_status():
 def chat_message():
     """Handle chat messages with file attachments and camera captures"""
     try:
-        from services.text_ai_service import text_ai_service
-        from services.file_processor import file_processor
-        from langdetect import detect
-        
         message = request.form.get('message', '').strip()
         attachments_info = request.form.get('attachments', '[]')
         camera_capture = request.form.get('camera_capture')
         
         # Parse attachments info
         try:
-            attachments_info = json.loads(attachments_info)
+            attachments_info = orjson.loads(attachments_info)
         except:
             attachments_info = []
         
         processed_attachments = []
         file_contents = []
         
-        # Process uploaded files
-        for i, attachment_info in enumerate(attachments_info):
-            file_key = f'file_{i}'
-            if file_key in request.files:
-                uploaded_file = request.files[file_key]
-                if uploaded_file.filename:
-                    try:
-                        file_data = uploaded_file.read()
-                        result = file_processor.process_file(file_data, uploaded_file.filename)
-                        
-                        if result['success']:
-                            processed_attachments.append({
-                                'name': uploaded_file.filename,
-                                'type': result['file_type'],
-                                'size': result['file_size'],
-                                'analysis': result['processed_data']
-                            })
-                            
-                            # Add content to file_contents for AI processing
-                            if 'content' in result['processed_data']:
-                                file_contents.append({
-                                    'filename': uploaded_file.filename,
-                                    'content': result['processed_data']['content'],
-                                    'type': result['file_type']
-                                })
-                        else:
-                            processed_attachments.append({
-                                'name': uploaded_file.filename,
-                                'type': 'error',
-                                'error': result.get('error', 'Unknown error')
-                            })
-                    except Exception as e:
-                        logging.error(f"Error processing file {uploaded_file.filename}: {e}")
-                        processed_attachments.append({
-                            'name': uploaded_file.filename,
-                            'type': 'error',
-                            'error': str(e)
+        # Process uploaded files concurrently; results are merged in upload order
+        uploads = [request.files[f'file_{i}'] for i in range(len(attachments_info))
+                   if f'file_{i}' in request.files and request.files[f'file_{i}'].filename]
+        # Only the content preview is passed to the AI, so long PDFs are not extracted in full;
+        # thumbnails go back in the JSON response rather than to disk
+        futures = [_attachment_executor.submit(file_processor.process_file, uploaded_file.stream,
+                                               uploaded_file.filename, preview_only=True, inline=True)
+                   for uploaded_file in uploads]
+        
+        for uploaded_file, future in zip(uploads, futures):
+            try:
+                result = future.result()
+                
+                if result['success']:
+                    processed_attachments.append({
+                        'name': uploaded_file.filename,
+                        'type': result['file_type'],
+                        'size': result['file_size'],
+                        'analysis': result['processed_data']
+                    })
+                    
+                    # Add content to file_contents for AI processing
+                    if 'content' in result['processed_data']:
+                        file_contents.append({
+                            'filename': uploaded_file.filename,
+                            'content': result['processed_data']['content'],
+                            'type': result['file_type']
                         })
+                else:
+                    processed_attachments.append({
+                        'name': uploaded_file.filename,
+                        'type': 'error',
+                        'error': result.get('error', 'Unknown error')
+                    })
+            except Exception as e:
+                logging.error(f"Error processing file {uploaded_file.filename}: {e}")
+                processed_attachments.append({
+                    'name': uploaded_file.filename,
+                    'type': 'error',
+                    'error': str(e)
+                })
         
         # Process camera capture
         if camera_capture:
             try:
-                result = file_processor.process_camera_capture(camera_capture)
+                # The capture is only analyzed for the reply, so it is not written to disk
+                result = file_processor.process_camera_capture(camera_capture, save=False)
                 if result.get('success', False):
                     processed_attachments.append({
                         'name': 'Camera Capture',
@@ -417,55 +569,40 @@ def chat_message():
         message_language = 'english'
         if message:
             try:
-                detected_lang = detect(message)
-                language_map = {
-                    'en': 'english',
-                    'ur': 'urdu',
-                    'ar': 'arabic',
-                    'hi': 'hindi',
-                    'es': 'spanish',
-                    'fr': 'french'
-                }
-                message_language = language_map.get(detected_lang, 'english')
+                detected_lang = _detect_language(message[:256])
+                message_language = _LANG_MAP.get(detected_lang, 'english')
             except:
                 message_language = 'english'
         
         # Build comprehensive prompt for AI
-        ai_prompt = ""
+        prompt_parts = []
         
         if message:
-            ai_prompt += f"User message: {message}\n\n"
+            prompt_parts.append(f"User message: {message}\n\n")
         
         if file_contents:
-            ai_prompt += "Attached files content:\n"
+            prompt_parts.append("Attached files content:\n")
             for file_info in file_contents:
-                ai_prompt += f"\n--- {file_info['filename']} ({file_info['type']}) ---\n"
-                ai_prompt += file_info['content'][:2000]  # Limit content length
-                if len(file_info['content']) > 2000:
-                    ai_prompt += "\n[Content truncated...]"
-                ai_prompt += "\n"
+                content = file_info['content']
+                prompt_parts.extend((
+                    f"\n--- {file_info['filename']} ({file_info['type']}) ---\n",
+                    content[:2000],  # Limit content length
+                    "\n[Content truncated...]" if len(content) > 2000 else "",
+                    "\n"
+                ))
         
-        if not ai_prompt.strip():
-            ai_prompt = "User sent attachments without a message. Please analyze and respond to the attached content."
+        if not prompt_parts:
+            prompt_parts = ["User sent attachments without a message. Please analyze and respond to the attached content."]
         
         # Add context about capabilities
-        ai_prompt += f"\n\nPlease respond in {message_language}. You are an AI assistant with access to:"
-        ai_prompt += "\n- File analysis (documents, images, spreadsheets, archives)"
-        ai_prompt += "\n- Computer vision and OpenCV image processing"
-        ai_prompt += "\n- Text generation and content creation"
-        ai_prompt += "\n- Multi-language support"
-        ai_prompt += "\nProvide helpful, accurate responses based on the user's input and any attached content."
+        prompt_parts.append(_CAPABILITY_SUFFIX[message_language])
+        ai_prompt = "".join(prompt_parts)
         
-        # Generate AI response
-        ai_response = text_ai_service._use_gemini(ai_prompt, 1000)
+        # Generate AI response from whichever configured provider answers first
+        ai_response = text_ai_service.race_providers(ai_prompt, 1000)
         
         if not ai_response:
-            # Fallback to other providers
-            ai_response = text_ai_service._use_openai(ai_prompt, 1000)
-            if not ai_response:
-                ai_response = text_ai_service._use_huggingface(ai_prompt, 1000)
-                if not ai_response:
-                    ai_response = "I apologize, but I'm having trouble processing your request right now. Please try again or check your API keys in settings."
+            ai_response = "I apologize, but I'm having trouble processing your request right now. Please try again or check your API keys in settings."
         
         # Prepare response attachments (analysis results, generated content, etc.)
         response_attachments = []
@@ -485,9 +622,11 @@ def chat_message():
             'language_detected': message_language,
             'processed_attachments': processed_attachments,
             'attachments': response_attachments,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': datetime.utcnow()
         })
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         logging.error(f"Error processing chat message: {e}")
         return jsonify({
@@ -499,8 +638,6 @@ def chat_message():
 def generate_text_ai():
     """Generate AI content using the text AI service"""
     try:
-        from services.text_ai_service import text_ai_service
-        
         data = request.get_json()
         
         content_type = data.get('content_type', 'social_post')
@@ -552,41 +689,11 @@ def generate_text_ai():
 def update_config():
     """Update API configuration"""
     try:
-        import os
         data = request.get_json()
-        
-        # Environment variable mappings
-        env_mappings = {
-            # AI Text/Chat APIs
-            'gemini_api_key': 'GEMINI_API_KEY',
-            'huggingface_api_key': 'HUGGINGFACE_API_KEY',
-            'aiml_api_key': 'AIML_API_KEY',
-            'openai_api_key': 'OPENAI_API_KEY',
-            
-            # Image Generation APIs
-            'deepai_api_key': 'DEEPAI_API_KEY',
-            'replicate_api_key': 'REPLICATE_API_KEY',
-            'stability_api_key': 'STABILITY_API_KEY',
-            
-            # TTS/Voice APIs
-            'elevenlabs_api_key': 'ELEVENLABS_API_KEY',
-            'assembly_api_key': 'ASSEMBLY_API_KEY',
-            
-            # Social Media APIs
-            'facebook_access_token': 'FACEBOOK_ACCESS_TOKEN',
-            'facebook_page_id': 'FACEBOOK_PAGE_ID',
-            
-            # Communication APIs
-            'gmail_client_id': 'GMAIL_CLIENT_ID',
-            'gmail_client_secret': 'GMAIL_CLIENT_SECRET',
-            'whatsapp_token': 'WHATSAPP_TOKEN',
-            'whatsapp_verify_token': 'WHATSAPP_VERIFY_TOKEN'
-        }
-        
         updated_keys = []
         
         # Update environment variables
-        for form_key, env_key in env_mappings.items():
+        for form_key, env_key in _ENV_MAPPINGS.items():
             if form_key in data and data[form_key]:
                 value = data[form_key]
                 # Don't update if it's masked (showing asterisks)
@@ -595,6 +702,8 @@ def update_config():
                     updated_keys.append(env_key)
         
         logging.info(f"Updated API keys: {updated_keys}")
+        if updated_keys:
+            _provider_status_body.cache_clear()
         
         return jsonify({
             'success': True, 
@@ -1,8 +1,26 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 import logging
+import os
+from models import CommandHistory, AutoReplyLog, SocialMediaPost
+from services.voice_service import voice_service
+from services.whatsapp_service import whatsapp_service
 
 main_bp = Blueprint('main', __name__)
 
+# API keys shown on the settings page
+_API_KEY_NAMES = (
+    # AI Text/Chat APIs
+    'GEMINI_API_KEY', 'HUGGINGFACE_API_KEY', 'AIML_API_KEY', 'OPENAI_API_KEY',
+    # Image Generation APIs
+    'DEEPAI_API_KEY', 'REPLICATE_API_KEY', 'STABILITY_API_KEY',
+    # TTS/Voice APIs
+    'ELEVENLABS_API_KEY', 'ASSEMBLY_API_KEY',
+    # Social Media APIs
+    'FACEBOOK_ACCESS_TOKEN', 'FACEBOOK_PAGE_ID',
+    # Communication APIs
+    'GMAIL_CLIENT_ID', 'GMAIL_CLIENT_SECRET', 'WHATSAPP_TOKEN', 'WHATSAPP_VERIFY_TOKEN',
+)
+
 @main_bp.route('/')
 def index():
     """Main chat interface page"""
@@ -12,8 +30,6 @@ def index():
 def dashboard():
     """Dashboard with command history and system status"""
     try:
-        from models import CommandHistory, AutoReplyLog, SocialMediaPost
-        
         # Get recent activities
         recent_commands = CommandHistory.query.order_by(CommandHistory.created_at.desc()).limit(10).all()
         recent_replies = AutoReplyLog.query.order_by(AutoReplyLog.created_at.desc()).limit(10).all()
@@ -38,38 +54,10 @@ def text_generator():
 def settings():
     """Settings page for configuration"""
     try:
-        from services.voice_service import voice_service
-        import os
-        
         voice_info = voice_service.get_voice_info()
         
         # Get current API key status (masked for security)
-        api_keys = {
-            # AI Text/Chat APIs
-            'GEMINI_API_KEY': os.getenv('GEMINI_API_KEY'),
-            'HUGGINGFACE_API_KEY': os.getenv('HUGGINGFACE_API_KEY'),
-            'AIML_API_KEY': os.getenv('AIML_API_KEY'),
-            'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY'),
-            
-            # Image Generation APIs
-            'DEEPAI_API_KEY': os.getenv('DEEPAI_API_KEY'),
-            'REPLICATE_API_KEY': os.getenv('REPLICATE_API_KEY'),
-            'STABILITY_API_KEY': os.getenv('STABILITY_API_KEY'),
-            
-            # TTS/Voice APIs
-            'ELEVENLABS_API_KEY': os.getenv('ELEVENLABS_API_KEY'),
-            'ASSEMBLY_API_KEY': os.getenv('ASSEMBLY_API_KEY'),
-            
-            # Social Media APIs
-            'FACEBOOK_ACCESS_TOKEN': os.getenv('FACEBOOK_ACCESS_TOKEN'),
-            'FACEBOOK_PAGE_ID': os.getenv('FACEBOOK_PAGE_ID'),
-            
-            # Communication APIs
-            'GMAIL_CLIENT_ID': os.getenv('GMAIL_CLIENT_ID'),
-            'GMAIL_CLIENT_SECRET': os.getenv('GMAIL_CLIENT_SECRET'),
-            'WHATSAPP_TOKEN': os.getenv('WHATSAPP_TOKEN'),
-            'WHATSAPP_VERIFY_TOKEN': os.getenv('WHATSAPP_VERIFY_TOKEN')
-        }
+        api_keys = {key: os.getenv(key) for key in _API_KEY_NAMES}
         
         return render_template('settings.html', voice_info=voice_info, api_keys=api_keys)
     except Exception as e:
@@ -80,7 +68,6 @@ def settings():
 def test_voice():
     """Test voice functionality"""
     try:
-        from services.voice_service import voice_service
         voice_service.speak("Voice test successful. I can speak clearly.")
         return jsonify({'success': True, 'message': 'Voice test completed'})
     except Exception as e:
@@ -91,8 +78,6 @@ def test_voice():
 def whatsapp_webhook():
     """WhatsApp webhook endpoint"""
     try:
-        from services.whatsapp_service import whatsapp_service
-        
         if request.method == 'GET':
             # Webhook verification
             mode = request.args.get('hub.mode')
@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+class CircuitBreaker:
+    """
+    Stop calling a failing dependency for a cooldown period
+    Opens after fail_max consecutive failures; after reset_timeout one trial call is let through
+    is_failure decides which results of call() count as failures (by default None)
+    """
+    
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0,
+                 is_failure: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure or (lambda result: result is None)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being short-circuited"""
+        with self._lock:
+            return self._opened_at is not None
+    
+    def allow(self) -> bool:
+        """Check whether a call may go through now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: let a single trial call decide whether to close again
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info(f"Circuit for {self.name} closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.fail_max:
+                if self._opened_at is None:
+                    logging.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+    
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call func through the breaker; returns None without calling it while open
+        
+        A result matching is_failure or an exception counts as a failure; exceptions are re-raised.
+        """
+        if not self.allow():
+            return None
+        
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        
+        if self.is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
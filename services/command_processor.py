@@ -1,12 +1,116 @@
 import logging
 import re
-import os
+from cachetools import TTLCache
 from datetime import datetime
+from functools import lru_cache
+from flask import current_app, has_app_context
 from services.voice_service import voice_service
 from services.gemini_service import gemini_service
-from services.facebook_service import facebook_service
+from services.facebook_service import get_facebook_service
 from services.email_service import email_service
 from services.whatsapp_service import whatsapp_service
+from services.text_ai_service import text_ai_service
+
+try:
+    from models import CommandHistory, AutoReplyLog, activity_counts_since
+except ImportError:
+    # Imported outside the Flask app; database logging and stats are unavailable
+    CommandHistory = AutoReplyLog = activity_counts_since = None
+
+# Command categories in priority order with the keywords that select them
+_COMMAND_KEYWORDS = (
+    ('facebook_post', ('facebook', 'post', 'share')),
+    ('create_image', ('image', 'picture', 'generate', 'create image')),
+    ('text_generation', ('write', 'blog', 'article', 'content', 'reply')),
+    ('system_status', ('status', 'how are you', 'system')),
+    ('auto_reply_status', ('auto reply', 'email', 'whatsapp', 'messages')),
+)
+_KEYWORD_RANK = {keyword: rank for rank, (_, keywords) in enumerate(_COMMAND_KEYWORDS) for keyword in keywords}
+
+# Longest keyword first, so a phrase like 'auto reply' is not read as 'reply'
+_KEYWORD_RX = re.compile('|'.join(re.escape(keyword) for keyword in sorted(_KEYWORD_RANK, key=len, reverse=True)))
+
+@lru_cache(maxsize=256)
+def _classify(command_text):
+    """Command type for a case-folded command; repeated transcripts are answered from cache"""
+    # One scan finds every keyword occurrence; the highest-priority category wins
+    rank = min((_KEYWORD_RANK[match.group()] for match in _KEYWORD_RX.finditer(command_text)),
+               default=None)
+    return 'general_query' if rank is None else _COMMAND_KEYWORDS[rank][0]
+
+# Topic extraction patterns, tried in order per command type
+_TOPIC_PATTERNS = {
+    'post': tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+        r'post about (.+)',
+        r'create.*post.*about (.+)',
+        r'facebook.*about (.+)',
+        r'share (.+)',
+        r'post (.+)'
+    )),
+    'image': tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+        r'generate.*image.*of (.+)',
+        r'create.*image.*of (.+)',
+        r'make.*picture.*of (.+)',
+        r'image of (.+)',
+        r'picture of (.+)',
+        r'generate (.+)',
+        r'create (.+)'
+    ))
+}
+# Fallback keywords whose trailing text is taken as the topic
+_TOPIC_KEYWORDS = {
+    'post': ('post', 'about', 'facebook'),
+    'image': ('image', 'picture', 'generate', 'create')
+}
+_LEADING_FILLER_RX = re.compile(r'^(of|about|on|for)\s+', re.IGNORECASE)
+
+# Words stripped from text generation commands to leave the topic
+_TEXT_STRIP_PATTERN = r'\b(?:write|create|generate|make)\s+(?:an?\s+)?|\b(?:about|for|on)\s+'
+
+@lru_cache(maxsize=32)
+def _text_strip_rx(content_type):
+    """Single pattern removing command verbs, prepositions and the content type name"""
+    content_type_pattern = content_type.replace('_', r'\s*')
+    return re.compile(rf'\b{content_type_pattern}\b|{_TEXT_STRIP_PATTERN}', re.IGNORECASE)
+
+# Words selecting a text content type, in priority order
+_CONTENT_TYPE_WORDS = (
+    ('blog_article', ('blog', 'blogs', 'article', 'articles')),
+    ('email_reply', ('email', 'emails', 'reply', 'replies')),
+    ('creative_story', ('story', 'stories')),
+    ('review', ('review', 'reviews')),
+    ('tutorial', ('tutorial', 'tutorials', 'guide', 'guides')),
+    ('product_description', ('product', 'products')),
+    ('news_article', ('news',)),
+)
+# word -> (priority, content type); the lowest priority among the command's words wins
+_CONTENT_TYPE_TABLE = {
+    word: (rank, content_type)
+    for rank, (content_type, words) in enumerate(_CONTENT_TYPE_WORDS)
+    for word in words
+}
+
+# Words asking for an image to be attached to a post
+_IMAGE_MARKERS = frozenset({'image', 'images', 'picture', 'pictures', 'photo', 'photos'})
+
+# Words asking for an Urdu response
+_URDU_MARKERS = frozenset({'urdu', 'اردو', 'لکھو', 'بنائو'})
+
+_WORD_RX = re.compile(r'\w+')
+
+@lru_cache(maxsize=256)
+def _tokenize(command_text):
+    """Set of words in a command, shared by the checks that run on the same text"""
+    return frozenset(_WORD_RX.findall(command_text))
+
+def _get_db():
+    """SQLAlchemy extension of the running app, or None outside an application context"""
+    if not has_app_context():
+        return None
+    return current_app.extensions['sqlalchemy']
+
+# Today's activity counters for the status command, keyed by day
+_activity_counts_cache = TTLCache(maxsize=2, ttl=30)
 
 class CommandProcessor:
     def __init__(self):
@@ -22,18 +126,25 @@ class CommandProcessor:
     def process_command(self, command_text):
         """Process voice command and determine action"""
         try:
-            command_text = command_text.lower().strip()
+            # Normalize once here; everything downstream expects case-folded text
+            command_text = command_text.casefold().strip()
+            if not command_text:
+                return {
+                    'success': False,
+                    'message': "I didn't catch a command. Please try again.",
+                    'command_type': 'empty'
+                }
+            
             logging.info(f"Processing command: {command_text}")
             
             command_log = None
+            db = _get_db()
             
             # Try to log command to database
-            try:
-                from flask import current_app
-                from models import CommandHistory
-                
-                with current_app.app_context():
-                    db = current_app.extensions['sqlalchemy']
+            if db is None:
+                logging.warning("Could not log command to database: no application context")
+            else:
+                try:
                     command_log = CommandHistory(
                         command_text=command_text,
                         command_type='unknown',
@@ -41,22 +152,23 @@ class CommandProcessor:
                     )
                     db.session.add(command_log)
                     db.session.commit()
-            except Exception as db_error:
-                logging.warning(f"Could not log command to database: {db_error}")
+                except Exception as db_error:
+                    db.session.rollback()
+                    command_log = None
+                    logging.warning(f"Could not log command to database: {db_error}")
             
             result = self.classify_and_execute_command(command_text)
             
             # Try to update command log
             if command_log:
                 try:
-                    with current_app.app_context():
-                        db = current_app.extensions['sqlalchemy']
-                        command_log.status = 'completed' if result['success'] else 'failed'
-                        command_log.result = result['message']
-                        command_log.command_type = result.get('command_type', 'unknown')
-                        command_log.completed_at = datetime.utcnow()
-                        db.session.commit()
+                    command_log.status = 'completed' if result['success'] else 'failed'
+                    command_log.result = result['message']
+                    command_log.command_type = result.get('command_type', 'unknown')
+                    command_log.completed_at = datetime.utcnow()
+                    db.session.commit()
                 except Exception as db_error:
+                    db.session.rollback()
                     logging.warning(f"Could not update command log: {db_error}")
             
             # Speak the result
@@ -75,31 +187,8 @@ class CommandProcessor:
             }
     
     def classify_and_execute_command(self, command_text):
-        """Classify command and execute appropriate action"""
-        
-        # Facebook post commands
-        if any(keyword in command_text for keyword in ['facebook', 'post', 'share']):
-            return self.process_facebook_post(command_text)
-        
-        # Image generation commands
-        elif any(keyword in command_text for keyword in ['image', 'picture', 'generate', 'create image']):
-            return self.process_image_generation(command_text)
-        
-        # Text generation commands
-        elif any(keyword in command_text for keyword in ['write', 'blog', 'article', 'content', 'reply', 'email']):
-            return self.process_text_generation(command_text)
-        
-        # System status commands
-        elif any(keyword in command_text for keyword in ['status', 'how are you', 'system']):
-            return self.process_system_status(command_text)
-        
-        # Auto-reply status commands
-        elif any(keyword in command_text for keyword in ['auto reply', 'email', 'whatsapp', 'messages']):
-            return self.process_auto_reply_status(command_text)
-        
-        # General query
-        else:
-            return self.process_general_query(command_text)
+        """Classify an already case-folded command and execute appropriate action"""
+        return self.commands[_classify(command_text)](command_text)
     
     def process_facebook_post(self, command_text):
         """Process Facebook post creation command"""
@@ -115,10 +204,10 @@ class CommandProcessor:
                 }
             
             # Check if image is requested
-            include_image = any(keyword in command_text for keyword in ['image', 'picture', 'photo'])
+            include_image = not _IMAGE_MARKERS.isdisjoint(_tokenize(command_text))
             
             # Create Facebook post
-            success, result = facebook_service.create_post_with_ai_content(topic, include_image)
+            success, result = get_facebook_service().create_post_with_ai_content(topic, include_image)
             
             if success:
                 message = f"Successfully created Facebook post about {topic}"
@@ -164,9 +253,6 @@ class CommandProcessor:
             filename = f"generated_image_{timestamp}.png"
             image_path = f"static/generated_images/{filename}"
             
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            
             # Generate image
             success, result = gemini_service.generate_image(description, image_path)
             
@@ -198,24 +284,13 @@ class CommandProcessor:
     def process_text_generation(self, command_text):
         """Process text generation command"""
         try:
-            from services.text_ai_service import text_ai_service
-            
-            # Determine content type from command
-            content_type = 'social_post'  # default
-            if 'blog' in command_text or 'article' in command_text:
-                content_type = 'blog_article'
-            elif 'email' in command_text or 'reply' in command_text:
-                content_type = 'email_reply'
-            elif 'story' in command_text:
-                content_type = 'creative_story'
-            elif 'review' in command_text:
-                content_type = 'review'
-            elif 'tutorial' in command_text or 'guide' in command_text:
-                content_type = 'tutorial'
-            elif 'product' in command_text:
-                content_type = 'product_description'
-            elif 'news' in command_text:
-                content_type = 'news_article'
+            tokens = _tokenize(command_text)
+            
+            # Determine content type from command; the earliest-listed type wins
+            content_type = min(
+                filter(None, map(_CONTENT_TYPE_TABLE.get, tokens)),
+                default=(None, 'social_post')
+            )[1]
             
             # Extract topic from command
             topic = self.extract_text_topic(command_text, content_type)
@@ -229,7 +304,7 @@ class CommandProcessor:
             
             # Determine language (default to English, but detect Urdu/other languages)
             language = 'english'
-            if any(urdu_word in command_text for urdu_word in ['urdu', 'اردو', 'لکھو', 'بنائو']):
+            if not _URDU_MARKERS.isdisjoint(tokens):
                 language = 'urdu'
             
             # Generate content
@@ -267,26 +342,9 @@ class CommandProcessor:
             }
     
     def extract_text_topic(self, command_text, content_type):
-        """Extract topic from text generation command"""
-        # Common patterns to remove
-        patterns_to_remove = [
-            r'write\s+(a|an)?\s*',
-            r'create\s+(a|an)?\s*',
-            r'generate\s+(a|an)?\s*',
-            r'make\s+(a|an)?\s*',
-            content_type.replace('_', r'\s*'),
-            r'about\s*',
-            r'for\s*',
-            r'on\s*'
-        ]
-        
-        topic = command_text.lower()
-        
-        # Remove patterns
-        for pattern in patterns_to_remove:
-            topic = re.sub(pattern, ' ', topic)
-        
-        # Clean up
+        """Extract topic from an already case-folded text generation command"""
+        # Remove command words in one pass, then clean up whitespace
+        topic = _text_strip_rx(content_type).sub(' ', command_text)
         topic = ' '.join(topic.split())
         
         # Return the cleaned topic if it has enough content
@@ -295,7 +353,8 @@ class CommandProcessor:
     def process_general_query(self, command_text):
         """Process general query using Gemini"""
         try:
-            response = gemini_service.generate_text_response(command_text)
+            # The user is waiting on this answer, so race the providers
+            response = gemini_service.generate_text_response(command_text, hedge=True)
             
             return {
                 'success': True,
@@ -320,21 +379,13 @@ class CommandProcessor:
             recent_posts = 0
             
             try:
-                from flask import current_app
-                from models import CommandHistory, AutoReplyLog, SocialMediaPost
-                
-                # Count recent activities
-                recent_commands = CommandHistory.query.filter(
-                    CommandHistory.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-                ).count()
-                
-                recent_replies = AutoReplyLog.query.filter(
-                    AutoReplyLog.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-                ).count()
-                
-                recent_posts = SocialMediaPost.query.filter(
-                    SocialMediaPost.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-                ).count()
+                # Count today's activities in one query, reused briefly across repeated status commands
+                today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                counts = _activity_counts_cache.get(today)
+                if counts is None:
+                    counts = tuple(activity_counts_since(today))
+                    _activity_counts_cache[today] = counts
+                recent_commands, recent_replies, recent_posts = counts
             except Exception as db_error:
                 logging.warning(f"Could not get database stats: {db_error}")
             
@@ -366,11 +417,10 @@ class CommandProcessor:
             recent_replies = []
             
             try:
-                from flask import current_app
-                from models import AutoReplyLog
-                
-                # Get recent auto-reply activity
-                recent_replies = AutoReplyLog.query.order_by(AutoReplyLog.created_at.desc()).limit(5).all()
+                # Get recent auto-reply activity; only the columns reported below are loaded
+                recent_replies = AutoReplyLog.query.with_entities(
+                    AutoReplyLog.platform, AutoReplyLog.sender, AutoReplyLog.created_at
+                ).order_by(AutoReplyLog.created_at.desc()).limit(5).all()
             except Exception as db_error:
                 logging.warning(f"Could not get auto-reply data: {db_error}")
             
@@ -407,48 +457,19 @@ class CommandProcessor:
     def extract_topic_from_command(self, command_text, command_type):
         """Extract topic/content from voice command"""
         try:
-            # Common patterns for different command types
-            patterns = {
-                'post': [
-                    r'post about (.+)',
-                    r'create.*post.*about (.+)',
-                    r'facebook.*about (.+)',
-                    r'share (.+)',
-                    r'post (.+)'
-                ],
-                'image': [
-                    r'generate.*image.*of (.+)',
-                    r'create.*image.*of (.+)',
-                    r'make.*picture.*of (.+)',
-                    r'image of (.+)',
-                    r'picture of (.+)',
-                    r'generate (.+)',
-                    r'create (.+)'
-                ]
-            }
-            
-            if command_type in patterns:
-                for pattern in patterns[command_type]:
-                    match = re.search(pattern, command_text, re.IGNORECASE)
-                    if match:
-                        return match.group(1).strip()
+            for pattern in _TOPIC_PATTERNS.get(command_type, ()):
+                match = pattern.search(command_text)
+                if match:
+                    return match.group(1).strip()
             
             # If no pattern matches, try to extract content after common keywords
-            keywords = {
-                'post': ['post', 'about', 'facebook'],
-                'image': ['image', 'picture', 'generate', 'create']
-            }
-            
-            if command_type in keywords:
-                for keyword in keywords[command_type]:
-                    if keyword in command_text:
-                        parts = command_text.split(keyword, 1)
-                        if len(parts) > 1:
-                            topic = parts[1].strip()
-                            # Remove common words from the beginning
-                            topic = re.sub(r'^(of|about|on|for)\s+', '', topic, flags=re.IGNORECASE)
-                            if topic:
-                                return topic
+            for keyword in _TOPIC_KEYWORDS.get(command_type, ()):
+                _, found, rest = command_text.partition(keyword)
+                if found:
+                    # Remove common words from the beginning
+                    topic = _LEADING_FILLER_RX.sub('', rest.strip())
+                    if topic:
+                        return topic
             
             return None
             
@@ -1,7 +1,10 @@
 import os
 import logging
 import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
+from email.utils import parseaddr
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -9,14 +12,31 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from services.gemini_service import gemini_service
 
+try:
+    from app import db
+    from models import AutoReplyLog
+except ImportError:
+    # Imported outside the Flask app; auto-replies are sent but not logged
+    db = AutoReplyLog = None
+
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly', 
           'https://www.googleapis.com/auth/gmail.send']
 
+# Headers needed to list emails and thread replies to them
+REPLY_HEADERS = ['Subject', 'From', 'Message-ID']
+
+# Maximum number of calls Gmail accepts in one batch request
+GMAIL_BATCH_LIMIT = 100
+
+# Workers generating auto-reply text in parallel
+_reply_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='auto-reply')
+
 class EmailService:
     def __init__(self):
         self.service = None
         self.credentials = None
+        self._msgs = None
         self.initialize_gmail_service()
     
     def initialize_gmail_service(self):
@@ -38,46 +58,72 @@ class EmailService:
             
             self.credentials = creds
             self.service = build('gmail', 'v1', credentials=creds)
+            # Bind the messages resource once instead of rebuilding the chain per call
+            self._msgs = self.service.users().messages()
             logging.info("Gmail service initialized successfully")
             
         except Exception as e:
             logging.error(f"Error initializing Gmail service: {e}")
     
-    def get_unread_emails(self, max_results=10):
-        """Get unread emails"""
+    def get_unread_emails(self, max_results=10, include_body=False):
+        """Get unread emails
+        
+        By default only headers and the snippet are fetched; include_body also downloads
+        and decodes the full message body.
+        """
         if not self.service:
             return []
         
         try:
-            results = self.service.users().messages().list(
+            results = self._msgs.list(
                 userId='me', 
                 q='is:unread',
                 maxResults=max_results
             ).execute()
             
             messages = results.get('messages', [])
+            fetched = {}
+            
+            def collect_message(request_id, response, exception):
+                if exception is not None:
+                    logging.error(f"Error fetching email {request_id}: {exception}")
+                else:
+                    fetched[request_id] = response
+            
+            # Fetch all messages in one batched HTTP request instead of one round trip each
+            for start in range(0, len(messages), GMAIL_BATCH_LIMIT):
+                batch = self.service.new_batch_http_request(callback=collect_message)
+                for message in messages[start:start + GMAIL_BATCH_LIMIT]:
+                    if include_body:
+                        request = self._msgs.get(userId='me', id=message['id'], format='full')
+                    else:
+                        request = self._msgs.get(userId='me', id=message['id'], format='metadata',
+                                                 metadataHeaders=REPLY_HEADERS)
+                    batch.add(request, request_id=message['id'])
+                batch.execute()
+            
             emails = []
             
             for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me', 
-                    id=message['id']
-                ).execute()
+                msg = fetched.get(message['id'])
+                if msg is None:
+                    continue
                 
                 # Extract email details
-                headers = msg['payload'].get('headers', [])
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
+                headers = self._header_map(msg['payload'])
+                subject = headers.get('subject', 'No Subject')
+                sender = headers.get('from', 'Unknown')
                 
                 # Get email body
-                body = self.extract_email_body(msg['payload'])
+                body = self.extract_email_body(msg['payload']) if include_body else ''
                 
                 emails.append({
                     'id': message['id'],
                     'subject': subject,
                     'sender': sender,
                     'body': body,
-                    'snippet': msg.get('snippet', '')
+                    'snippet': msg.get('snippet', ''),
+                    'headers': headers
                 })
             
             return emails
@@ -86,42 +132,55 @@ class EmailService:
             logging.error(f"Error fetching emails: {e}")
             return []
     
+    def _header_map(self, payload):
+        """Map lowercased header names to values; header names are case-insensitive"""
+        return {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
+    
     def extract_email_body(self, payload):
-        """Extract email body from payload"""
-        body = ""
+        """Extract the first text/plain body from a (possibly nested) MIME payload"""
+        # Breadth-first walk so multipart/alternative inside multipart/mixed is found too
+        queue = deque([payload])
+        while queue:
+            part = queue.popleft()
+            data = part.get('body', {}).get('data')
+            if part.get('mimeType') == 'text/plain' and data:
+                return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+            queue.extend(part.get('parts', ()))
         
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body']['data']
-                    body = base64.urlsafe_b64decode(data).decode('utf-8')
-                    break
-        elif payload['body'].get('data'):
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+        # Single-part messages of another type still carry their body at the top level
+        data = payload.get('body', {}).get('data')
+        if data and 'parts' not in payload:
+            return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
         
-        return body
+        return ""
     
-    def send_reply(self, original_email_id, reply_content):
-        """Send reply to an email"""
+    def send_reply(self, original_email_id, reply_content, original_headers=None):
+        """Send reply to an email
+        
+        original_headers is the lowercased header map from get_unread_emails; when it is
+        missing the headers are fetched.
+        """
         if not self.service:
             return False, "Gmail service not available"
         
         try:
-            # Get original email for reply headers
-            original = self.service.users().messages().get(
-                userId='me', 
-                id=original_email_id
-            ).execute()
+            headers = original_headers
+            if headers is None:
+                # Get original email for reply headers
+                original = self._msgs.get(
+                    userId='me', 
+                    id=original_email_id,
+                    format='metadata',
+                    metadataHeaders=REPLY_HEADERS
+                ).execute()
+                headers = self._header_map(original['payload'])
             
-            headers = original['payload'].get('headers', [])
-            original_subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            original_from = next((h['value'] for h in headers if h['name'] == 'From'), '')
-            original_message_id = next((h['value'] for h in headers if h['name'] == 'Message-ID'), '')
+            original_subject = headers.get('subject', 'No Subject')
+            original_from = headers.get('from', '')
+            original_message_id = headers.get('message-id', '')
             
             # Extract email address from "Name <email@domain.com>" format
-            import re
-            email_match = re.search(r'<(.+?)>', original_from)
-            to_email = email_match.group(1) if email_match else original_from
+            to_email = parseaddr(original_from)[1] or original_from
             
             # Create reply message
             reply_subject = f"Re: {original_subject}" if not original_subject.startswith('Re:') else original_subject
@@ -136,13 +195,13 @@ class EmailService:
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
             
             # Send reply
-            self.service.users().messages().send(
+            self._msgs.send(
                 userId='me',
                 body={'raw': raw_message}
             ).execute()
             
             # Mark original as read
-            self.service.users().messages().modify(
+            self._msgs.modify(
                 userId='me',
                 id=original_email_id,
                 body={'removeLabelIds': ['UNREAD']}
@@ -155,26 +214,30 @@ class EmailService:
             logging.error(f"Error sending reply: {e}")
             return False, f"Error: {str(e)}"
     
-    def process_auto_replies(self):
-        """Process unread emails and send auto-replies"""
+    def process_auto_replies(self, include_body=False):
+        """Process unread emails and send auto-replies
+        
+        Replies are written from the message snippet unless include_body is set.
+        """
         if not self.service:
             logging.warning("Gmail service not available for auto-replies")
             return []
         
         processed = []
+        pending_logs = []
         
         try:
-            unread_emails = self.get_unread_emails()
-            
-            for email in unread_emails:
-                # Generate auto-reply using Gemini
-                reply_content = gemini_service.generate_auto_reply(
-                    email['body'] or email['snippet'],
-                    context="email"
-                )
-                
+            unread_emails = self.get_unread_emails(include_body=include_body)
+            
+            # Generate auto-replies concurrently; the pool size keeps within AI rate limits
+            replies = _reply_executor.map(
+                lambda email: gemini_service.generate_auto_reply(email['body'] or email['snippet'], context="email"),
+                unread_emails
+            )
+            
+            for email, reply_content in zip(unread_emails, replies):
                 # Send reply
-                success, message = self.send_reply(email['id'], reply_content)
+                success, message = self.send_reply(email['id'], reply_content, email['headers'])
                 
                 if success:
                     processed.append({
@@ -184,19 +247,15 @@ class EmailService:
                         'status': 'sent'
                     })
                     
-                    # Log to database
-                    from app import db
-                    from models import AutoReplyLog
-                    
-                    log = AutoReplyLog(
-                        platform='email',
-                        sender=email['sender'],
-                        original_message=email['body'] or email['snippet'],
-                        reply_message=reply_content,
-                        status='sent'
-                    )
-                    db.session.add(log)
-                    db.session.commit()
+                    # Queue the database log; all rows are written in one transaction
+                    if AutoReplyLog is not None:
+                        pending_logs.append(AutoReplyLog(
+                            platform='email',
+                            sender=email['sender'],
+                            original_message=email['body'] or email['snippet'],
+                            reply_message=reply_content,
+                            status='sent'
+                        ))
                 else:
                     processed.append({
                         'sender': email['sender'],
@@ -210,6 +269,20 @@ class EmailService:
         except Exception as e:
             logging.error(f"Error processing auto-replies: {e}")
             return []
+        finally:
+            # Replies already sent are logged even if a later email failed
+            if pending_logs:
+                self._save_reply_logs(pending_logs)
+    
+    def _save_reply_logs(self, logs, chunk_size=500):
+        """Insert auto-reply logs in chunks, committing once per chunk"""
+        for start in range(0, len(logs), chunk_size):
+            try:
+                db.session.add_all(logs[start:start + chunk_size])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error saving auto-reply logs: {e}")
 
 # Global email service instance
 email_service = EmailService()
@@ -3,215 +3,378 @@ Enhanced Voice Service with multilingual support
 Supports Urdu, Pashto, English and other languages
 """
 
+import atexit
 import pyttsx3
+import hashlib
+import json
 import logging
 import os
-from threading import Thread
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Dict, Optional, List
+from services.error_handling import log_errors
+
+try:
+    import ahocorasick
+except ImportError:
+    # Without pyahocorasick voice names are classified with the per-language regexes
+    ahocorasick = None
+
+try:
+    import pysbd
+except ImportError:
+    # Without pysbd long texts are split on sentence-ending punctuation
+    pysbd = None
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    # Without numba batches of voice names are classified one at a time in Python
+    njit = None
+
+# Common language patterns in voice names, shared by discovery, voice search
+# and get_available_voices; matched as substrings in this order
+LANGUAGE_PATTERNS = {
+    'en': ('english', 'en_', 'us', 'uk', 'australian', 'david', 'zira', 'hazel'),
+    'ur': ('urdu', 'ur_', 'pakistan', 'pakistani'),
+    'ps': ('pashto', 'ps_', 'afghan', 'afghanistan'),
+    'hi': ('hindi', 'hi_', 'indian', 'india'),
+    'ar': ('arabic', 'ar_', 'saudi', 'egypt'),
+    'es': ('spanish', 'es_', 'mexico', 'spain'),
+    'fr': ('french', 'fr_', 'france'),
+    'de': ('german', 'de_', 'germany')
+}
+
+# Common spellings mapped to language codes
+LANGUAGE_ALIASES = {
+    'urdu': 'ur',
+    'pashto': 'ps',
+    'pushto': 'ps',
+    'english': 'en',
+    'hindi': 'hi',
+    'arabic': 'ar'
+}
+
+# Sentences spoken by test_voice, per language
+TEST_TEXTS = MappingProxyType({
+    'en': 'Voice test successful. I can speak clearly in English.',
+    'ur': 'آواز کا ٹیسٹ کامیاب ہے۔ میں اردو میں واضح طور پر بول سکتا ہوں۔',
+    'ps': 'د غږ ازموینه بریالۍ وه. زه کولی شم په پښتو کې څرګنده خبرې وکړم.',
+    'hi': 'आवाज़ परीक्षण सफल है। मैं हिंदी में स्पष्ट रूप से बोल सकता हूँ।',
+    'ar': 'اختبار الصوت ناجح. يمكنني التحدث بوضوح باللغة العربية.'
+})
+
+# One compiled alternation per language, checked in the order above
+LANG_PATTERNS = {lang: re.compile('|'.join(map(re.escape, pats)), re.I)
+                 for lang, pats in LANGUAGE_PATTERNS.items()}
+
+def _build_voice_automaton():
+    """Map every pattern to (language rank, language) in one Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for rank, (lang, patterns) in enumerate(LANGUAGE_PATTERNS.items()):
+        for pattern in patterns:
+            if pattern not in automaton:
+                automaton.add_word(pattern, (rank, lang))
+    automaton.make_automaton()
+    return automaton
+
+_VOICE_AUTOMATON = _build_voice_automaton() if ahocorasick is not None else None
+
+def _voice_language(name: str) -> Optional[str]:
+    """Return the first language whose patterns occur in a voice name"""
+    if _VOICE_AUTOMATON is not None:
+        # One scan of the name finds every pattern; the lowest rank keeps the table's priority
+        return min((match for _, match in _VOICE_AUTOMATON.iter(name.lower())),
+                   default=(None, None))[1]
+    for lang, rx in LANG_PATTERNS.items():
+        if rx.search(name):
+            return lang
+    return None
+
+# Language codes in priority order; _classify_voice_names returns indexes into this
+LANGUAGE_CODES = tuple(LANGUAGE_PATTERNS)
+
+# Sentence ends in Latin, Arabic-script and Devanagari text, used when pysbd is unavailable
+_SENTENCE_END_RX = re.compile(r'(?<=[.!?\u06d4\u061f\u0964])\s+')
+
+@lru_cache(maxsize=16)
+def _segmenter(language: str):
+    """pysbd segmenter for a language, or None if pysbd does not support it"""
+    try:
+        return pysbd.Segmenter(language=language, clean=False)
+    except ValueError:
+        return None
+
+def _split_sentences(text: str, language: str) -> List[str]:
+    """Split text into sentences so speech can start after the first one"""
+    segmenter = _segmenter(language) if pysbd is not None else None
+    if segmenter is not None:
+        sentences = segmenter.segment(text)
+    else:
+        sentences = _SENTENCE_END_RX.split(text)
+    return [s.strip() for s in sentences if s.strip()] or [text]
+
+# Discovered voice maps are cached here, one file per set of installed voices
+VOICE_MAP_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'voicesocialai')
+
+# Below this many voices the JIT kernel is not worth its dispatch overhead
+NUMBA_MIN_VOICES = 64
+
+def _first_pattern_match(names, name_offsets, patterns, pattern_offsets, pattern_langs):
+    """Language index of the first pattern found in each name, or -1
+
+    names and patterns are concatenated lowercased UTF-8 bytes split by the offset
+    arrays; patterns are ordered by language priority.
+    """
+    out = np.full(len(name_offsets) - 1, -1, np.int64)
+    for i in range(len(name_offsets) - 1):
+        start = name_offsets[i]
+        end = name_offsets[i + 1]
+        for p in range(len(pattern_offsets) - 1):
+            p_start = pattern_offsets[p]
+            p_len = pattern_offsets[p + 1] - p_start
+            found = False
+            for j in range(start, end - p_len + 1):
+                k = 0
+                while k < p_len and names[j + k] == patterns[p_start + k]:
+                    k += 1
+                if k == p_len:
+                    found = True
+                    break
+            if found:
+                out[i] = pattern_langs[p]
+                break
+    return out
+
+def _pack_strings(strings):
+    """Concatenate lowercased strings as uint8 bytes with an offsets array"""
+    encoded = [s.lower().encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+if njit is not None:
+    _first_pattern_match_jit = njit(cache=True)(_first_pattern_match)
+    _PATTERN_BYTES, _PATTERN_OFFSETS = _pack_strings(
+        [pat for pats in LANGUAGE_PATTERNS.values() for pat in pats])
+    _PATTERN_LANGS = np.array(
+        [rank for rank, pats in enumerate(LANGUAGE_PATTERNS.values()) for _ in pats], np.int64)
+
+def _classify_voice_names(names: List[str]) -> List[int]:
+    """Classify many voice names at once, returning LANGUAGE_CODES indexes (-1 for none)"""
+    if njit is not None and len(names) >= NUMBA_MIN_VOICES:
+        name_bytes, name_offsets = _pack_strings(names)
+        return _first_pattern_match_jit(name_bytes, name_offsets, _PATTERN_BYTES,
+                                        _PATTERN_OFFSETS, _PATTERN_LANGS).tolist()
+    langs = map(_voice_language, names)
+    return [LANGUAGE_CODES.index(lang) if lang else -1 for lang in langs]
 
 class EnhancedVoiceService:
     def __init__(self):
         self.engine = pyttsx3.init()
+        # Enumerating voices round-trips into the platform TTS driver, so do it once
+        self._voices = list(self.engine.getProperty('voices') or [])
+        self._voices_by_id = {v.id: v for v in self._voices if getattr(v, 'id', None)}
         self.current_language = 'en'
         self.language_voices = {}
         self.setup_voice()
         self._discover_language_voices()
+        # Preferred voice id per language, resolved once after discovery
+        self._voice_id_by_lang = {lang: vs[0]['id'] for lang, vs in self.language_voices.items() if vs}
+        # Voice used for the current language; speak() falls back to it
+        self._voice_id = self._find_language_voice(self.current_language) or self.engine.getProperty('voice')
         
+        # One worker owns the engine, so utterances play in order and never overlap
+        self._tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='enhanced-tts')
+        atexit.register(self._tts_executor.shutdown, wait=False, cancel_futures=True)
+        # Queued sentences that stop_speaking() can still cancel
+        self._tts_pending = set()
+        
+    @log_errors("Error setting up voice")
     def setup_voice(self):
         """Configure voice settings"""
-        try:
-            voices = self.engine.getProperty('voices')
-            if voices and len(voices) > 0:
-                # Try to find best voice for current language
-                self._set_language_voice(self.current_language)
-            
-            # Set speech properties
-            self.engine.setProperty('rate', 180)  # Speed of speech
-            self.engine.setProperty('volume', 0.9)  # Volume level (0.0 to 1.0)
-            
-        except Exception as e:
-            logging.error(f"Error setting up voice: {e}")
+        # Set speech properties; runs before the TTS worker starts, after which only
+        # the worker touches the engine
+        self.rate = 180  # Speed of speech
+        self.volume = 0.9  # Volume level (0.0 to 1.0)
+        self.engine.setProperty('rate', self.rate)
+        self.engine.setProperty('volume', self.volume)
+    
+    def _voice_map_path(self) -> str:
+        """Cache file for the voice map; the name changes with the installed voices or patterns"""
+        digest = hashlib.blake2b(digest_size=16)
+        for voice_id in sorted(self._voices_by_id):
+            digest.update(str(voice_id).encode() + b'\0')
+        digest.update(repr(LANGUAGE_PATTERNS).encode())
+        return os.path.join(VOICE_MAP_CACHE_DIR, f"voice_map_{digest.hexdigest()}.json")
     
+    @log_errors("Error discovering language voices")
     def _discover_language_voices(self):
         """Discover available voices for different languages"""
+        voices = self._voices
+        if not voices:
+            return
+        
+        cache_path = self._voice_map_path()
         try:
-            voices = self.engine.getProperty('voices')
-            if not voices:
-                return
-            
-            # Common language patterns in voice names
-            language_patterns = {
-                'en': ['english', 'en_', 'us', 'uk', 'australian', 'david', 'zira', 'hazel'],
-                'ur': ['urdu', 'ur_', 'pakistan', 'pakistani'],
-                'ps': ['pashto', 'ps_', 'afghan', 'afghanistan'],
-                'hi': ['hindi', 'hi_', 'indian', 'india'],
-                'ar': ['arabic', 'ar_', 'saudi', 'egypt'],
-                'es': ['spanish', 'es_', 'mexico', 'spain'],
-                'fr': ['french', 'fr_', 'france'],
-                'de': ['german', 'de_', 'germany']
-            }
-            
-            for voice in voices:
-                if not hasattr(voice, 'name') or not voice.name:
-                    continue
-                    
-                voice_name_lower = voice.name.lower()
-                
-                for lang_code, patterns in language_patterns.items():
-                    if any(pattern in voice_name_lower for pattern in patterns):
-                        if lang_code not in self.language_voices:
-                            self.language_voices[lang_code] = []
-                        self.language_voices[lang_code].append({
-                            'id': voice.id,
-                            'name': voice.name,
-                            'language': lang_code
-                        })
-                        break
-            
-            logging.info(f"Discovered voices for languages: {list(self.language_voices.keys())}")
-            
-        except Exception as e:
-            logging.error(f"Error discovering language voices: {e}")
+            with open(cache_path, encoding='utf-8') as f:
+                self.language_voices = json.load(f)
+            logging.info(f"Loaded cached voices for languages: {list(self.language_voices.keys())}")
+            return
+        except (OSError, ValueError):
+            pass
+        
+        named = [(voice, voice.name) for voice in voices if getattr(voice, 'name', None)]
+        ranks = _classify_voice_names([name for _, name in named])
+        
+        for (voice, name), rank in zip(named, ranks):
+            if rank >= 0:
+                lang_code = LANGUAGE_CODES[rank]
+                self.language_voices.setdefault(lang_code, []).append({
+                    'id': voice.id,
+                    'name': name,
+                    'language': lang_code
+                })
+        
+        logging.info(f"Discovered voices for languages: {list(self.language_voices.keys())}")
+        self._save_voice_map(cache_path)
+    
+    def _save_voice_map(self, cache_path: str):
+        """Write the discovered voice map for the next start; failures only cost a rediscovery"""
+        try:
+            os.makedirs(VOICE_MAP_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.language_voices, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not cache voice map: {e}")
     
     def set_language(self, language_code: str) -> bool:
         """Set the voice language"""
         language_code = language_code.lower()
         
         # Map common language codes
-        lang_map = {
-            'urdu': 'ur',
-            'pashto': 'ps',
-            'pushto': 'ps',
-            'english': 'en',
-            'hindi': 'hi',
-            'arabic': 'ar'
-        }
-        
-        mapped_lang = lang_map.get(language_code, language_code)
+        mapped_lang = LANGUAGE_ALIASES.get(language_code, language_code)
         
-        if self._set_language_voice(mapped_lang):
+        # Only the voice id is recorded; the TTS worker applies it to the engine
+        voice_id = self._find_language_voice(mapped_lang)
+        if voice_id:
             self.current_language = mapped_lang
+            self._voice_id = voice_id
             logging.info(f"Voice language set to: {mapped_lang}")
             return True
         else:
             logging.warning(f"No voice found for language: {mapped_lang}, using default")
             return False
     
-    def _set_language_voice(self, language_code: str) -> bool:
-        """Set voice for specific language"""
-        try:
-            # First try to use discovered language-specific voices
-            if language_code in self.language_voices and self.language_voices[language_code]:
-                best_voice = self.language_voices[language_code][0]  # Use first available
-                self.engine.setProperty('voice', best_voice['id'])
-                logging.debug(f"Set voice to: {best_voice['name']} for language: {language_code}")
-                return True
-            
-            # Fallback: try to find voice by manual search
-            voices = self.engine.getProperty('voices')
-            if not voices:
-                return False
-            
-            # Search patterns for different languages
-            search_patterns = {
-                'ur': ['urdu', 'pakistan'],
-                'ps': ['pashto', 'afghan'],
-                'en': ['english', 'david', 'zira', 'hazel', 'microsoft'],
-                'hi': ['hindi', 'indian'],
-                'ar': ['arabic', 'saudi']
-            }
-            
-            patterns = search_patterns.get(language_code, [language_code])
-            
-            for voice in voices:
-                if not hasattr(voice, 'name') or not voice.name:
-                    continue
-                    
-                voice_name_lower = voice.name.lower()
-                if any(pattern in voice_name_lower for pattern in patterns):
-                    self.engine.setProperty('voice', voice.id)
-                    logging.debug(f"Found and set voice: {voice.name} for language: {language_code}")
-                    return True
-            
-            # If no specific language voice found, use first available voice
-            if hasattr(voices[0], 'id'):
-                self.engine.setProperty('voice', voices[0].id)
-                logging.debug(f"Using default voice for language: {language_code}")
-                return True
+    @log_errors("Error finding language voice")
+    def _find_language_voice(self, language_code: str) -> Optional[str]:
+        """Id of the voice to use for a language, or None; does not touch the engine"""
+        # First try to use discovered language-specific voices
+        if language_code in self.language_voices and self.language_voices[language_code]:
+            best_voice = self.language_voices[language_code][0]  # Use first available
+            logging.debug(f"Chose voice: {best_voice['name']} for language: {language_code}")
+            return best_voice['id']
+        
+        # Fallback: try to find voice by manual search
+        voices = self._voices
+        if not voices:
+            return None
+        
+        # Discovery files each voice under its first matching language, so a
+        # voice can still match this language's patterns here
+        pattern = LANG_PATTERNS.get(language_code) or re.compile(re.escape(language_code), re.I)
+        
+        for voice in voices:
+            name = getattr(voice, 'name', None)
+            if not name:
+                continue
                 
-        except Exception as e:
-            logging.error(f"Error setting language voice for {language_code}: {e}")
+            if pattern.search(name):
+                logging.debug(f"Found voice: {name} for language: {language_code}")
+                return voice.id
         
-        return False
+        # If no specific language voice found, use first available voice
+        first_id = getattr(voices[0], 'id', None)
+        if first_id:
+            logging.debug(f"Using default voice for language: {language_code}")
+        return first_id
+    
+    def _resolve_voice_id(self, language: Optional[str]) -> Optional[str]:
+        """Pick the voice for a language from the discovered voices, without engine calls"""
+        if language:
+            language = language.lower()
+            voice_id = self._voice_id_by_lang.get(LANGUAGE_ALIASES.get(language, language))
+            if voice_id:
+                return voice_id
+        # No discovered voice for the language; keep the current one
+        return self._voice_id
     
+    @log_errors("Error in text-to-speech", False)
     def speak(self, text: str, language: Optional[str] = None) -> bool:
         """Convert text to speech with optional language override"""
+        # The override is resolved here and applied by the worker, so the
+        # service's current language is never switched and restored
+        voice_id = self._resolve_voice_id(language or self.current_language)
+        # Queue sentence by sentence so the first one plays without waiting for the rest
+        lang = language or self.current_language
+        for sentence in _split_sentences(text, LANGUAGE_ALIASES.get(lang.lower(), lang.lower())):
+            future = self._tts_executor.submit(self._speak, sentence, voice_id)
+            self._tts_pending.add(future)
+            future.add_done_callback(self._tts_pending.discard)
+        
+        logging.info(f"Speaking in {language or self.current_language}: {text[:50]}...")
+        return True
+    
+    def stop_speaking(self) -> int:
+        """Drop queued sentences that have not started playing; returns how many were dropped"""
+        return sum(future.cancel() for future in list(self._tts_pending))
+    
+    def _speak(self, text: str, voice_id: Optional[str]):
+        """Run on the TTS worker thread"""
         try:
-            # Set temporary language if specified
-            original_language = None
-            if language and language != self.current_language:
-                original_language = self.current_language
-                self.set_language(language)
-            
-            def _speak():
-                try:
-                    self.engine.say(text)
-                    self.engine.runAndWait()
-                except Exception as e:
-                    logging.error(f"Error during speech synthesis: {e}")
-            
-            # Run speech in separate thread to avoid blocking
-            thread = Thread(target=_speak)
-            thread.daemon = True
-            thread.start()
-            
-            # Restore original language if it was temporarily changed
-            if original_language:
-                self.set_language(original_language)
-            
-            logging.info(f"Speaking in {language or self.current_language}: {text[:50]}...")
-            return True
-            
+            if voice_id:
+                self.engine.setProperty('voice', voice_id)
+            self.engine.say(text)
+            self.engine.runAndWait()
         except Exception as e:
-            logging.error(f"Error in text-to-speech: {e}")
-            return False
+            logging.error(f"Error during speech synthesis: {e}")
     
+    @log_errors("Error in multilingual speech", False)
     def speak_multilingual(self, text_dict: Dict[str, str]) -> bool:
         """Speak text in multiple languages"""
-        try:
-            current_lang = text_dict.get(self.current_language)
-            if current_lang:
-                return self.speak(current_lang)
-            
-            # Fallback to English or first available
-            fallback_text = text_dict.get('en', list(text_dict.values())[0])
-            fallback_lang = 'en' if 'en' in text_dict else list(text_dict.keys())[0]
-            
-            return self.speak(fallback_text, fallback_lang)
-            
-        except Exception as e:
-            logging.error(f"Error in multilingual speech: {e}")
-            return False
+        current_lang = text_dict.get(self.current_language)
+        if current_lang:
+            return self.speak(current_lang)
+        
+        # Fallback to English or first available
+        fallback_lang = 'en' if 'en' in text_dict else next(iter(text_dict))
+        fallback_text = text_dict[fallback_lang]
+        
+        # No override needed when the fallback is already the current language
+        return self.speak(fallback_text, None if fallback_lang == self.current_language else fallback_lang)
     
     def get_language_info(self) -> Dict:
         """Get current language and available voices information"""
         try:
-            voices = self.engine.getProperty('voices')
-            current_voice = self.engine.getProperty('voice')
-            rate = self.engine.getProperty('rate')
-            volume = self.engine.getProperty('volume')
+            # Read from the service rather than the engine, which the TTS worker owns
+            current_voice = self._voice_id
+            rate = self.rate
+            volume = self.volume
             
             # Get current voice details
             current_voice_info = None
-            if voices:
-                for voice in voices:
-                    if hasattr(voice, 'id') and voice.id == current_voice:
-                        current_voice_info = {
-                            'id': voice.id,
-                            'name': getattr(voice, 'name', 'Unknown'),
-                            'language': self.current_language
-                        }
-                        break
+            voice = self._voices_by_id.get(current_voice)
+            if voice is not None:
+                current_voice_info = {
+                    'id': voice.id,
+                    'name': getattr(voice, 'name', 'Unknown'),
+                    'language': self.current_language
+                }
             
             return {
                 'current_language': self.current_language,
@@ -237,54 +400,33 @@ class EnhancedVoiceService:
     
     def test_voice(self, language: Optional[str] = None) -> bool:
         """Test voice output with language-specific text"""
-        test_texts = {
-            'en': 'Voice test successful. I can speak clearly in English.',
-            'ur': 'آواز کا ٹیسٹ کامیاب ہے۔ میں اردو میں واضح طور پر بول سکتا ہوں۔',
-            'ps': 'د غږ ازموینه بریالۍ وه. زه کولی شم په پښتو کې څرګنده خبرې وکړم.',
-            'hi': 'आवाज़ परीक्षण सफल है। मैं हिंदी में स्पष्ट रूप से बोल सकता हूँ।',
-            'ar': 'اختبار الصوت ناجح. يمكنني التحدث بوضوح باللغة العربية.'
-        }
-        
         test_language = language or self.current_language
-        test_text = test_texts.get(test_language, test_texts['en'])
-        
-        return self.speak(test_text, test_language)
+        return self.speak(TEST_TEXTS.get(test_language, TEST_TEXTS['en']), test_language)
     
+    @log_errors("Error getting available voices", lambda e: [])
     def get_available_voices(self) -> List[Dict]:
         """Get list of all available voices"""
-        try:
-            voices = self.engine.getProperty('voices')
-            voice_list = []
-            
-            if voices:
-                for voice in voices:
-                    if hasattr(voice, 'id') and hasattr(voice, 'name'):
-                        voice_info = {
-                            'id': voice.id,
-                            'name': voice.name,
-                            'language': 'unknown'
-                        }
-                        
-                        # Try to determine language from voice name
-                        voice_name_lower = voice.name.lower()
-                        if any(pattern in voice_name_lower for pattern in ['english', 'en_', 'david', 'zira']):
-                            voice_info['language'] = 'en'
-                        elif any(pattern in voice_name_lower for pattern in ['urdu', 'pakistan']):
-                            voice_info['language'] = 'ur'
-                        elif any(pattern in voice_name_lower for pattern in ['pashto', 'afghan']):
-                            voice_info['language'] = 'ps'
-                        elif any(pattern in voice_name_lower for pattern in ['hindi', 'indian']):
-                            voice_info['language'] = 'hi'
-                        elif any(pattern in voice_name_lower for pattern in ['arabic', 'saudi']):
-                            voice_info['language'] = 'ar'
-                        
-                        voice_list.append(voice_info)
-            
-            return voice_list
-            
-        except Exception as e:
-            logging.error(f"Error getting available voices: {e}")
-            return []
+        voices = self._voices
+        voice_list = []
+        
+        if voices:
+            for voice in voices:
+                voice_id = getattr(voice, 'id', None)
+                if voice_id:
+                    name = getattr(voice, 'name', None)
+                    voice_list.append({
+                        'id': voice_id,
+                        'name': name,
+                        # Same classification as voice discovery
+                        'language': _voice_language(name or '') or 'unknown'
+                    })
+        
+        return voice_list
 
-# Global enhanced voice service instance
-enhanced_voice_service = EnhancedVoiceService()
\ No newline at end of file
+# Global enhanced voice service instance, created on first use so importing this
+# module never starts the TTS engine; DISABLE_TTS turns it off on servers without audio
+@lru_cache(maxsize=1)
+def get_enhanced_voice_service() -> Optional[EnhancedVoiceService]:
+    if os.environ.get('DISABLE_TTS'):
+        return None
+    return EnhancedVoiceService()
\ No newline at end of file
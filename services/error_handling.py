@@ -0,0 +1,23 @@
+import logging
+import functools
+from typing import Any
+
+def log_errors(message: str, default: Any = None):
+    """
+    Log exceptions raised by the decorated function and return a fallback instead
+    default is returned as is, or called with the exception if it is callable
+    """
+    def fallback(e):
+        logging.error(f"{message}: {e}")
+        return default(e) if callable(default) else default
+    
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                return fallback(e)
+        return wrapper
+    
+    return decorator
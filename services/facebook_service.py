@@ -1,172 +1,233 @@
 import os
+import hashlib
 import logging
+import orjson
 import requests
+import threading
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from services.error_handling import log_errors
 from services.gemini_service import gemini_service
 
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    # Without requests-toolbelt photos are uploaded as a buffered multipart body
+    MultipartEncoder = None
+
+try:
+    from app import db
+    from models import SocialMediaPost
+except ImportError:
+    # Imported outside the Flask app; posts are published but not logged
+    db = SocialMediaPost = None
+
+# (connect, read) timeouts for Graph API calls
+GRAPH_TIMEOUT = (3.05, 30)
+
+# Where AI-generated post images are written
+GENERATED_IMAGES_DIR = 'static/generated_images'
+
+# Generated post text per topic, reused for repeated topics within an hour
+_post_cache = TTLCache(maxsize=256, ttl=3600)
+_post_cache_lock = threading.Lock()
+
+# Runs image generation while the post text is generated on the calling thread
+_image_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fb-image')
+
 class FacebookService:
     def __init__(self):
         self.access_token = os.environ.get("FACEBOOK_ACCESS_TOKEN", "default_facebook_token")
         self.page_id = os.environ.get("FACEBOOK_PAGE_ID", "default_page_id")
         self.base_url = "https://graph.facebook.com/v17.0"
+        
+        # Keep connections to graph.facebook.com alive across calls; the token is
+        # attached to every request through the session params
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        self.session.params = {'access_token': self.access_token}
     
+    def _json_payload(self, response):
+        """Parse a Graph API response body once; non-JSON bodies give an empty dict"""
+        try:
+            # orjson decodes the raw bytes directly and is much faster than response.json()
+            payload = orjson.loads(response.content)
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+    
+    @log_errors("Error creating Facebook post", lambda e: (False, None, f"Error: {e}"))
     def create_text_post(self, message):
         """Create a text post on Facebook"""
-        try:
-            url = f"{self.base_url}/{self.page_id}/feed"
-            
-            params = {
-                'message': message,
-                'access_token': self.access_token
-            }
-            
-            response = requests.post(url, params=params)
+        url = f"{self.base_url}/{self.page_id}/feed"
+        
+        params = {
+            'message': message
+        }
+        
+        response = self.session.post(url, params=params, timeout=GRAPH_TIMEOUT)
+        
+        result = self._json_payload(response)
+        if response.ok:
+            post_id = result.get('id')
             
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id')
-                
-                logging.info(f"Facebook post created with ID: {post_id}")
-                return True, post_id, "Post created successfully"
-            else:
-                error_msg = response.json().get('error', {}).get('message', 'Unknown error')
-                logging.error(f"Failed to create Facebook post: {error_msg}")
-                return False, None, f"Error: {error_msg}"
-                
-        except Exception as e:
-            logging.error(f"Error creating Facebook post: {e}")
-            return False, None, f"Error: {str(e)}"
+            logging.info(f"Facebook post created with ID: {post_id}")
+            return True, post_id, "Post created successfully"
+        else:
+            error_msg = result.get('error', {}).get('message', 'Unknown error')
+            logging.error(f"Failed to create Facebook post: {error_msg}")
+            return False, None, f"Error: {error_msg}"
     
+    @log_errors("Error creating Facebook photo post", lambda e: (False, None, f"Error: {e}"))
     def create_photo_post(self, message, photo_path):
         """Create a photo post on Facebook"""
-        try:
-            url = f"{self.base_url}/{self.page_id}/photos"
-            
-            with open(photo_path, 'rb') as photo_file:
+        url = f"{self.base_url}/{self.page_id}/photos"
+        
+        with open(photo_path, 'rb') as photo_file:
+            if MultipartEncoder is not None:
+                # Stream the body in chunks instead of building it in memory
+                encoder = MultipartEncoder(fields={
+                    'message': message,
+                    'source': (os.path.basename(photo_path), photo_file, 'image/*')
+                })
+                response = self.session.post(url, data=encoder,
+                                             headers={'Content-Type': encoder.content_type},
+                                             timeout=(GRAPH_TIMEOUT[0], 60))
+            else:
                 files = {'source': photo_file}
                 data = {
-                    'message': message,
-                    'access_token': self.access_token
+                    'message': message
                 }
                 
-                response = requests.post(url, files=files, data=data)
+                response = self.session.post(url, files=files, data=data, timeout=GRAPH_TIMEOUT)
+        
+        result = self._json_payload(response)
+        if response.ok:
+            post_id = result.get('id')
             
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id')
-                
-                logging.info(f"Facebook photo post created with ID: {post_id}")
-                return True, post_id, "Photo post created successfully"
-            else:
-                error_msg = response.json().get('error', {}).get('message', 'Unknown error')
-                logging.error(f"Failed to create Facebook photo post: {error_msg}")
-                return False, None, f"Error: {error_msg}"
-                
-        except Exception as e:
-            logging.error(f"Error creating Facebook photo post: {e}")
-            return False, None, f"Error: {str(e)}"
+            logging.info(f"Facebook photo post created with ID: {post_id}")
+            return True, post_id, "Photo post created successfully"
+        else:
+            error_msg = result.get('error', {}).get('message', 'Unknown error')
+            logging.error(f"Failed to create Facebook photo post: {error_msg}")
+            return False, None, f"Error: {error_msg}"
     
-    def create_post_with_ai_content(self, topic, include_image=False):
-        """Create Facebook post with AI-generated content and optional image"""
-        try:
-            # Generate post content using Gemini
-            post_content = gemini_service.generate_facebook_post(topic)
-            
-            post_id = None
-            image_path = None
+    @log_errors("Error creating AI Facebook post", lambda e: (False, {'error': f"Error: {e}"}))
+    def create_post_with_ai_content(self, topic, include_image=False, nocache=False):
+        """Create Facebook post with AI-generated content and optional image
+        
+        AI post text is reused for a topic seen within the last hour unless nocache is set;
+        canned fallback text is never cached.
+        """
+        post_id = None
+        image_path = None
+        image_future = None
+        
+        if include_image:
+            # Hash the topic so any input gives a short, safe file name
+            safe = hashlib.blake2b(topic.encode(), digest_size=8).hexdigest()
+            image_path = f"{GENERATED_IMAGES_DIR}/fb_{safe}.png"
             
-            if include_image:
-                # Generate image
-                image_path = f"static/generated_images/facebook_post_{topic.replace(' ', '_')}.png"
-                os.makedirs(os.path.dirname(image_path), exist_ok=True)
-                
-                success, image_result = gemini_service.generate_image(
-                    f"Create an image for Facebook post about: {topic}",
-                    image_path
-                )
-                
-                if success:
-                    success, post_id, message = self.create_photo_post(post_content, image_path)
-                else:
-                    logging.warning(f"Image generation failed: {image_result}")
-                    success, post_id, message = self.create_text_post(post_content)
+            # Generate image alongside the text; the two Gemini calls are independent
+            image_future = _image_executor.submit(
+                gemini_service.generate_image,
+                f"Create an image for Facebook post about: {topic}",
+                image_path
+            )
+        
+        # Generate post content using Gemini
+        post_content = None
+        if not nocache:
+            with _post_cache_lock:
+                post_content = _post_cache.get(topic)
+        if post_content is None:
+            post_content = gemini_service.generate_facebook_post(topic, fallback=False)
+            if post_content is None:
+                post_content = gemini_service.fallback_facebook_post(topic)
             else:
-                success, post_id, message = self.create_text_post(post_content)
+                with _post_cache_lock:
+                    _post_cache[topic] = post_content
+        
+        if image_future is not None:
+            success, image_result = image_future.result()
             
             if success:
-                # Log to database
-                from app import db
-                from models import SocialMediaPost
-                
-                post = SocialMediaPost(
-                    platform='facebook',
-                    content=post_content,
-                    image_path=image_path,
-                    post_id=post_id,
-                    status='posted'
-                )
-                db.session.add(post)
-                db.session.commit()
-                
-                return True, {
-                    'post_id': post_id,
-                    'content': post_content,
-                    'image_path': image_path,
-                    'message': message
-                }
+                success, post_id, message = self.create_photo_post(post_content, image_path)
             else:
-                return False, {'error': message}
-                
-        except Exception as e:
-            logging.error(f"Error creating AI Facebook post: {e}")
-            return False, {'error': f"Error: {str(e)}"}
+                logging.warning(f"Image generation failed: {image_result}")
+                success, post_id, message = self.create_text_post(post_content)
+        else:
+            success, post_id, message = self.create_text_post(post_content)
+        
+        if success:
+            # Log to database
+            if SocialMediaPost is not None:
+                try:
+                    db.session.add(SocialMediaPost(
+                        platform='facebook',
+                        content=post_content,
+                        image_path=image_path,
+                        post_id=post_id,
+                        status='posted'
+                    ))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Error saving Facebook post log: {e}")
+            
+            return True, {
+                'post_id': post_id,
+                'content': post_content,
+                'image_path': image_path,
+                'message': message
+            }
+        else:
+            return False, {'error': message}
     
+    @log_errors("Error getting Facebook posts", lambda e: (False, f"Error: {e}"))
     def get_recent_posts(self, limit=10):
         """Get recent Facebook posts"""
-        try:
-            url = f"{self.base_url}/{self.page_id}/posts"
-            
-            params = {
-                'access_token': self.access_token,
-                'limit': limit,
-                'fields': 'id,message,created_time,story'
-            }
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                result = response.json()
-                return True, result.get('data', [])
-            else:
-                error_msg = response.json().get('error', {}).get('message', 'Unknown error')
-                logging.error(f"Failed to get Facebook posts: {error_msg}")
-                return False, f"Error: {error_msg}"
-                
-        except Exception as e:
-            logging.error(f"Error getting Facebook posts: {e}")
-            return False, f"Error: {str(e)}"
+        url = f"{self.base_url}/{self.page_id}/posts"
+        
+        params = {
+            'limit': limit,
+            'fields': 'id,message,created_time,story'
+        }
+        
+        response = self.session.get(url, params=params, timeout=GRAPH_TIMEOUT)
+        
+        result = self._json_payload(response)
+        if response.ok:
+            return True, result.get('data', [])
+        else:
+            error_msg = result.get('error', {}).get('message', 'Unknown error')
+            logging.error(f"Failed to get Facebook posts: {error_msg}")
+            return False, f"Error: {error_msg}"
     
+    @log_errors("Error deleting Facebook post", lambda e: (False, f"Error: {e}"))
     def delete_post(self, post_id):
         """Delete a Facebook post"""
-        try:
-            url = f"{self.base_url}/{post_id}"
-            
-            params = {
-                'access_token': self.access_token
-            }
-            
-            response = requests.delete(url, params=params)
-            
-            if response.status_code == 200:
-                logging.info(f"Facebook post {post_id} deleted")
-                return True, "Post deleted successfully"
-            else:
-                error_msg = response.json().get('error', {}).get('message', 'Unknown error')
-                logging.error(f"Failed to delete Facebook post: {error_msg}")
-                return False, f"Error: {error_msg}"
-                
-        except Exception as e:
-            logging.error(f"Error deleting Facebook post: {e}")
-            return False, f"Error: {str(e)}"
+        url = f"{self.base_url}/{post_id}"
+        
+        response = self.session.delete(url, timeout=GRAPH_TIMEOUT)
+        
+        result = self._json_payload(response)
+        if response.ok:
+            logging.info(f"Facebook post {post_id} deleted")
+            return True, "Post deleted successfully"
+        else:
+            error_msg = result.get('error', {}).get('message', 'Unknown error')
+            logging.error(f"Failed to delete Facebook post: {error_msg}")
+            return False, f"Error: {error_msg}"
 
-# Global Facebook service instance
-facebook_service = FacebookService()
+# Global Facebook service instance, created on first use
+@lru_cache(maxsize=1)
+def get_facebook_service():
+    return FacebookService()
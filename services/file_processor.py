@@ -1,18 +1,161 @@
 import os
 import logging
-import magic
-import cv2
+import importlib
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
-from PyPDF2 import PdfReader
-from docx import Document
-import openpyxl
+import shutil
+import threading
+import uuid
 import zipfile
 import json
-from typing import Dict, List, Optional, Tuple, Union
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 import base64
 from io import BytesIO
-from langdetect import detect
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+
+# OpenCV, libmagic and the document parsers are imported on first use, so workers that
+# never see a given format don't pay for loading it
+
+@lru_cache(maxsize=None)
+def _lazy_cv2():
+    return importlib.import_module('cv2')
+
+@lru_cache(maxsize=None)
+def _lazy_openpyxl():
+    return importlib.import_module('openpyxl')
+
+@lru_cache(maxsize=None)
+def _lazy_pdf_reader():
+    return importlib.import_module('PyPDF2').PdfReader
+
+@lru_cache(maxsize=None)
+def _lazy_docx_document():
+    return importlib.import_module('docx').Document
+
+@lru_cache(maxsize=None)
+def _lazy_pdfium():
+    try:
+        return importlib.import_module('pypdfium2')
+    except ImportError:
+        # Without pypdfium2 PDF text is extracted with PyPDF2
+        return None
+
+# Language profiles langdetect loads; ur and fa cover the app's Urdu and Pashto users
+DETECT_LANGUAGES = ('en', 'es', 'ar', 'fr', 'de', 'it', 'pt', 'ru', 'ja', 'ko',
+                    'zh-cn', 'zh-tw', 'hi', 'bn', 'id', 'ur', 'fa')
+
+@lru_cache(maxsize=1)
+def _language_factory():
+    """Private langdetect factory with only DETECT_LANGUAGES loaded, built on first detection
+
+    Seeded so results are deterministic instead of depending on langdetect's random sampling.
+    """
+    profiles = []
+    for lang in DETECT_LANGUAGES:
+        with open(os.path.join(PROFILES_DIRECTORY, lang), encoding='utf-8') as f:
+            profiles.append(f.read())
+    factory = DetectorFactory()
+    factory.load_json_profile(profiles)
+    factory.seed = 0
+    return factory
+
+def detect_language(text: str) -> str:
+    """Language code of text among DETECT_LANGUAGES; raises LangDetectException like detect()"""
+    detector = _language_factory().create()
+    detector.append(text)
+    return detector.detect()
+
+@lru_cache(maxsize=1024)
+def _detect_lang_cached(text_prefix: str) -> str:
+    """Detect the language of a document prefix; repeat uploads hit the cache"""
+    return detect_language(text_prefix)
+
+# Leading bytes of an upload passed to libmagic
+MAGIC_HEAD_BYTES = 8192
+
+# One libmagic handle for the process; loading its database per call is slow and a
+# handle must not be used by two threads at once
+@lru_cache(maxsize=1)
+def _magic_handle():
+    return importlib.import_module('magic').Magic(mime=True)
+
+_magic_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _load_face_cascade():
+    """Load the face cascade once; parsing the XML on every image was the slowest step"""
+    cv2 = _lazy_cv2()
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if cascade.empty():
+        logging.warning("Face cascade could not be loaded; face detection disabled")
+        return None
+    return cascade
+
+# Chunk and write-buffer size when saving uploads
+COPY_CHUNK_SIZE = 1 << 20
+
+# Independent image analyses (faces, edges, colors, thumbnail) run side by side here;
+# the OpenCV calls release the GIL
+_analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='image-analysis')
+
+# JPEG encoding of preview frames; cv2.imwrite releases the GIL
+_encode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='frame-encode')
+
+# JPEG quality of saved video preview frames
+VIDEO_FRAME_JPEG_QUALITY = 75
+
+# JPEG quality of thumbnails and frames returned inline as data URLs
+INLINE_JPEG_QUALITY = 80
+
+# Characters of document text kept in the preview
+PREVIEW_CHARS = 2000
+
+# Longest edge images are scaled down to before face, edge and color analysis
+ANALYSIS_MAX_DIM = 640
+
+# Dominant colors are counted in 16 levels per channel (4096 color bins)
+COLOR_BIN_BITS = 4
+
+@lru_cache(maxsize=1)
+def _lazy_gray_stats_kernel():
+    """Compile the fused luma mean/std kernel with numba on first use; None when numba is not installed"""
+    try:
+        from numba import njit, prange
+    except ImportError:
+        # Without numba brightness and contrast come from cv2.meanStdDev on the gray image
+        return None
+    
+    @njit(parallel=True, fastmath=True)
+    def gray_mean_std(img, row_sum, row_sq):
+        """Mean and standard deviation of a BGR image's luma without building the gray image
+
+        Rows are summed in parallel into row_sum and row_sq, one slot per row.
+        """
+        height = img.shape[0]
+        width = img.shape[1]
+        for y in prange(height):
+            total = 0.0
+            squares = 0.0
+            for x in range(width):
+                gray = 0.114 * img[y, x, 0] + 0.587 * img[y, x, 1] + 0.299 * img[y, x, 2]
+                total += gray
+                squares += gray * gray
+            row_sum[y] = total
+            row_sq[y] = squares
+        count = height * width
+        mean = row_sum.sum() / count
+        variance = max(row_sq.sum() / count - mean * mean, 0.0)
+        return mean, np.sqrt(variance)
+    
+    # Compile now rather than inside the first request's analysis
+    gray_mean_std(np.zeros((2, 2, 3), np.uint8), np.empty(2), np.empty(2))
+    return gray_mean_std
+
+# numba's default workqueue threading layer must not run two parallel kernels at once;
+# a request that finds the kernel busy uses the OpenCV path instead of waiting
+_gray_stats_lock = threading.Lock()
 
 class FileProcessor:
     """
@@ -35,40 +178,64 @@ class FileProcessor:
         os.makedirs(self.upload_dir, exist_ok=True)
         os.makedirs(f"{self.upload_dir}/processed", exist_ok=True)
         
-    def process_file(self, file_data: bytes, filename: str) -> Dict:
+        # A CascadeClassifier instance is not safe to share between concurrent detections
+        self._face_lock = threading.Lock()
+        
+    def process_file(self, file_data: Union[bytes, BinaryIO], filename: str, size: Optional[int] = None,
+                     preview_only: bool = False, inline: bool = False) -> Dict:
         """
         Process uploaded file and extract information
+        
+        file_data may be raw bytes or a readable stream, which is copied to disk in chunks so
+        memory use does not grow with the upload. size is the length when the caller knows it;
+        otherwise it is counted while writing. With preview_only, PDF text extraction stops
+        once the preview is filled. With inline, image thumbnails and video frames are returned
+        as data URLs instead of being written to the processed folder.
         """
         try:
-            # Save file temporarily
-            file_path = os.path.join(self.upload_dir, filename)
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
-            
-            # Detect file type
-            file_type = self._detect_file_type(file_path)
+            # Detect file type from the leading bytes, before the file is written
+            is_buffer = isinstance(file_data, (bytes, bytearray, memoryview))
+            head = bytes(file_data[:MAGIC_HEAD_BYTES]) if is_buffer else file_data.read(MAGIC_HEAD_BYTES)
+            file_type = self._detect_file_type_from_buffer(head, filename)
+            
+            # Save file temporarily; the uuid prefix keeps same-named uploads processed
+            # concurrently from overwriting each other
+            file_path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+            with open(file_path, 'wb', buffering=COPY_CHUNK_SIZE) as f:
+                if is_buffer:
+                    f.write(file_data)
+                else:
+                    f.write(head)
+                    shutil.copyfileobj(file_data, f, COPY_CHUNK_SIZE)
+                file_size = size if size is not None else f.tell()
+            
+            if file_type is None:
+                file_type = self._detect_file_type(file_path)
             file_ext = os.path.splitext(filename)[1].lower()
             
             result = {
                 'success': True,
                 'filename': filename,
                 'file_type': file_type,
-                'file_size': len(file_data),
+                'file_size': file_size,
                 'file_path': file_path,
                 'processed_data': {}
             }
             
-            # Process based on file type
+            # Process based on file type; the size is already known, so sub-processors don't stat the file
             if file_type == 'image':
-                result['processed_data'] = self._process_image(file_path)
+                result['processed_data'] = self._process_image(file_path, inline, file_size=file_size)
             elif file_type == 'document':
-                result['processed_data'] = self._process_document(file_path, file_ext)
+                # Documents passed in as bytes are parsed from memory instead of re-reading the file
+                result['processed_data'] = self._process_document(file_path, file_ext, preview_only,
+                                                                  file_data if is_buffer else None,
+                                                                  file_size=file_size)
             elif file_type == 'spreadsheet':
-                result['processed_data'] = self._process_spreadsheet(file_path)
+                result['processed_data'] = self._process_spreadsheet(file_path, file_size=file_size)
             elif file_type == 'archive':
-                result['processed_data'] = self._process_archive(file_path)
+                result['processed_data'] = self._process_archive(file_path, file_size=file_size)
             elif file_type == 'video':
-                result['processed_data'] = self._process_video(file_path)
+                result['processed_data'] = self._process_video(file_path, inline, file_size=file_size)
             else:
                 result['processed_data'] = {'content': 'File type not supported for content extraction'}
             
@@ -82,72 +249,130 @@ class FileProcessor:
                 'filename': filename
             }
     
+    def _detect_file_type_from_buffer(self, head: bytes, filename: str) -> Optional[str]:
+        """Detect file type from an upload's leading bytes; None if libmagic fails"""
+        try:
+            with _magic_lock:
+                mime_type = _magic_handle().from_buffer(head)
+        except Exception:
+            return None
+        
+        file_type = self._file_type_from_mime(mime_type)
+        if file_type == 'archive':
+            # Office files are ZIP containers that a short prefix may not reveal
+            file_ext = os.path.splitext(filename)[1].lower()
+            if file_ext in self.supported_formats['document'] + self.supported_formats['spreadsheet']:
+                return self._file_type_from_extension(filename)
+        return file_type
+    
     def _detect_file_type(self, file_path: str) -> str:
         """Detect file type using python-magic"""
         try:
-            mime_type = magic.from_file(file_path, mime=True)
-            
-            if mime_type.startswith('image/'):
-                return 'image'
-            elif mime_type.startswith('video/'):
-                return 'video'
-            elif mime_type.startswith('audio/'):
-                return 'audio'
-            elif 'pdf' in mime_type:
-                return 'document'
-            elif 'word' in mime_type or 'document' in mime_type:
-                return 'document'
-            elif 'spreadsheet' in mime_type or 'excel' in mime_type:
-                return 'spreadsheet'
-            elif 'zip' in mime_type or 'archive' in mime_type:
-                return 'archive'
-            else:
-                return 'unknown'
+            with _magic_lock:
+                mime_type = _magic_handle().from_file(file_path)
+            return self._file_type_from_mime(mime_type)
         except:
             # Fallback to file extension
-            file_ext = os.path.splitext(file_path)[1].lower()
-            for file_type, extensions in self.supported_formats.items():
-                if file_ext in extensions:
-                    return file_type
+            return self._file_type_from_extension(file_path)
+    
+    def _file_type_from_mime(self, mime_type: str) -> str:
+        """Map a MIME type to one of the processor's file types"""
+        if mime_type.startswith('image/'):
+            return 'image'
+        elif mime_type.startswith('video/'):
+            return 'video'
+        elif mime_type.startswith('audio/'):
+            return 'audio'
+        elif 'pdf' in mime_type:
+            return 'document'
+        elif 'word' in mime_type or 'document' in mime_type:
+            return 'document'
+        elif 'spreadsheet' in mime_type or 'excel' in mime_type:
+            return 'spreadsheet'
+        elif 'zip' in mime_type or 'archive' in mime_type:
+            return 'archive'
+        else:
             return 'unknown'
     
-    def _process_image(self, file_path: str) -> Dict:
+    def _file_type_from_extension(self, file_path: str) -> str:
+        """Guess the file type from the file extension"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        for file_type, extensions in self.supported_formats.items():
+            if file_ext in extensions:
+                return file_type
+        return 'unknown'
+    
+    def _file_size(self, file_path: str, file_size: Optional[int] = None) -> int:
+        """Return file_size when the caller already knows it, otherwise stat the file"""
+        return file_size if file_size is not None else os.path.getsize(file_path)
+    
+    def _process_image(self, file_path: str, inline: bool = False, file_size: Optional[int] = None) -> Dict:
         """Process image with OpenCV analysis"""
+        cv2 = _lazy_cv2()
         try:
-            # Basic image info
             img = cv2.imread(file_path)
+            return self._process_image_from_array(img, file_path, self._file_size(file_path, file_size), inline)
+        except Exception as e:
+            logging.error(f"Error processing image: {e}")
+            return {'content': f"Error analyzing image: {str(e)}"}
+    
+    def _process_image_from_array(self, img: np.ndarray, file_path: str, file_size: int,
+                                  inline: bool = False) -> Dict:
+        """Analyze a decoded image; file_path names the thumbnail and need not exist"""
+        cv2 = _lazy_cv2()
+        try:
+            if img is None:
+                raise ValueError("image could not be decoded")
+            
+            # Basic image info
             height, width = img.shape[:2]
             
+            # Faces, edges and colors are analyzed on a bounded-size copy
+            small = self._resize_for_analysis(img)
+            is_color = len(img.shape) == 3
+            
+            # Faces and edges only need the small copy in grayscale
+            small_gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if is_color else small
+            
+            # Start the independent analyses together
+            faces_future = _analysis_executor.submit(self._detect_faces, small_gray)
+            edges_future = _analysis_executor.submit(self._detect_edges, small_gray)
+            thumbnail_future = _analysis_executor.submit(self._generate_thumbnail, img, file_path, inline=inline)
+            colors_future = _analysis_executor.submit(self._get_dominant_colors, small) if is_color else None
+            
             # OpenCV analysis
             analysis = {
                 'dimensions': f"{width}x{height}",
                 'channels': img.shape[2] if len(img.shape) > 2 else 1,
-                'size_mb': round(os.path.getsize(file_path) / (1024*1024), 2)
+                'size_mb': round(file_size / (1024*1024), 2)
             }
             
             # Color analysis
-            if len(img.shape) == 3:
-                # Convert to different color spaces for analysis
-                hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-                lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-                
+            if is_color:
                 # Dominant colors
-                analysis['dominant_colors'] = self._get_dominant_colors(img)
+                analysis['dominant_colors'] = colors_future.result()
                 
-                # Brightness and contrast analysis
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                analysis['brightness'] = round(np.mean(gray), 2)
-                analysis['contrast'] = round(np.std(gray), 2)
+                # Brightness and contrast analysis, both from one pass over the pixels
+                gray_stats = _lazy_gray_stats_kernel()
+                if gray_stats is not None and _gray_stats_lock.acquire(blocking=False):
+                    # Fused kernel: luma, sum and sum of squares per pixel, rows in parallel
+                    try:
+                        mean, std = gray_stats(img, np.empty(height), np.empty(height))
+                    finally:
+                        _gray_stats_lock.release()
+                else:
+                    mean, std = (m[0, 0] for m in cv2.meanStdDev(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)))
+                analysis['brightness'] = round(float(mean), 2)
+                analysis['contrast'] = round(float(std), 2)
             
             # Face detection
-            analysis['faces_detected'] = self._detect_faces(img)
+            analysis['faces_detected'] = faces_future.result()
             
             # Object detection (simplified)
-            analysis['edges_detected'] = self._detect_edges(img)
+            analysis['edges_detected'] = edges_future.result()
             
             # Generate thumbnail
-            thumbnail_path = self._generate_thumbnail(file_path)
-            analysis['thumbnail'] = thumbnail_path
+            analysis['thumbnail'] = thumbnail_future.result()
             
             return {
                 'type': 'image_analysis',
@@ -159,41 +384,46 @@ class FileProcessor:
             logging.error(f"Error processing image: {e}")
             return {'content': f"Error analyzing image: {str(e)}"}
     
-    def _process_document(self, file_path: str, file_ext: str) -> Dict:
-        """Process document files (PDF, Word, etc.)"""
+    def _resize_for_analysis(self, img: np.ndarray, max_dim: int = ANALYSIS_MAX_DIM) -> np.ndarray:
+        """Scale an image down so its longest edge is at most max_dim"""
+        cv2 = _lazy_cv2()
+        height, width = img.shape[:2]
+        scale = max_dim / max(height, width)
+        if scale >= 1:
+            return img
+        return cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))),
+                          interpolation=cv2.INTER_AREA)
+    
+    def _process_document(self, file_path: str, file_ext: str, preview_only: bool = False,
+                          file_data: Optional[bytes] = None, file_size: Optional[int] = None) -> Dict:
+        """Process document files (PDF, Word, etc.); file_data is the file's contents if already in memory"""
         try:
             content = ""
             metadata = {}
             
             if file_ext == '.pdf':
-                reader = PdfReader(file_path)
-                metadata['pages'] = len(reader.pages)
-                
-                for page in reader.pages:
-                    content += page.extract_text() + "\n"
-                    
-                if hasattr(reader, 'metadata') and reader.metadata:
-                    metadata.update({
-                        'title': reader.metadata.get('/Title', 'Unknown'),
-                        'author': reader.metadata.get('/Author', 'Unknown'),
-                        'subject': reader.metadata.get('/Subject', 'Unknown')
-                    })
+                # Stop after the preview (plus a margin for word count) when the full text isn't needed
+                max_chars = 2 * PREVIEW_CHARS if preview_only else None
+                content, pdf_metadata = self._extract_pdf(file_path, max_chars, file_data)
+                metadata.update(pdf_metadata)
             
             elif file_ext in ['.docx', '.doc']:
-                doc = Document(file_path)
-                metadata['paragraphs'] = len(doc.paragraphs)
-                
-                for paragraph in doc.paragraphs:
-                    content += paragraph.text + "\n"
+                doc = _lazy_docx_document()(file_path)
+                paragraphs = doc.paragraphs
+                metadata['paragraphs'] = len(paragraphs)
+                content = "\n".join(paragraph.text for paragraph in paragraphs)
             
             elif file_ext == '.txt':
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
+                if file_data is not None:
+                    content = bytes(file_data).decode('utf-8', errors='ignore')
+                else:
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        content = f.read()
             
             # Language detection
             if content.strip():
                 try:
-                    detected_language = detect(content[:1000])  # Use first 1000 chars
+                    detected_language = _detect_lang_cached(content[:1000])  # Use first 1000 chars
                     metadata['language'] = detected_language
                 except:
                     metadata['language'] = 'unknown'
@@ -204,11 +434,11 @@ class FileProcessor:
             metadata.update({
                 'word_count': words,
                 'character_count': chars,
-                'size_kb': round(os.path.getsize(file_path) / 1024, 2)
+                'size_kb': round(self._file_size(file_path, file_size) / 1024, 2)
             })
             
             # Truncate content if too long
-            preview = content[:2000] + "..." if len(content) > 2000 else content
+            preview = content[:PREVIEW_CHARS] + "..." if len(content) > PREVIEW_CHARS else content
             
             return {
                 'type': 'document',
@@ -222,36 +452,93 @@ class FileProcessor:
             logging.error(f"Error processing document: {e}")
             return {'content': f"Error reading document: {str(e)}"}
     
-    def _process_spreadsheet(self, file_path: str) -> Dict:
+    def _extract_pdf(self, file_path: str, max_chars: Optional[int] = None,
+                     file_data: Optional[bytes] = None) -> Tuple[str, Dict]:
+        """Extract PDF text and metadata, stopping after max_chars of text if given"""
+        parts = []
+        extracted = 0
+        metadata = {}
+        
+        pdfium = _lazy_pdfium()
+        if pdfium is not None:
+            # PDFium extracts text natively, much faster than PyPDF2's pure-Python parser
+            pdf = pdfium.PdfDocument(bytes(file_data) if file_data is not None else file_path)
+            try:
+                metadata['pages'] = len(pdf)
+                info = pdf.get_metadata_dict()
+                if info:
+                    metadata.update({
+                        'title': info.get('Title') or 'Unknown',
+                        'author': info.get('Author') or 'Unknown',
+                        'subject': info.get('Subject') or 'Unknown'
+                    })
+                for index in range(len(pdf)):
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_range()
+                    textpage.close()
+                    page.close()
+                    parts.append(text)
+                    extracted += len(text)
+                    if max_chars is not None and extracted >= max_chars:
+                        metadata['truncated'] = True
+                        break
+            finally:
+                pdf.close()
+        else:
+            source = BytesIO(file_data) if file_data is not None else file_path
+            reader = _lazy_pdf_reader()(source, strict=False)
+            metadata['pages'] = len(reader.pages)
+            
+            for page in reader.pages:
+                text = page.extract_text() or ""
+                parts.append(text)
+                extracted += len(text)
+                if max_chars is not None and extracted >= max_chars:
+                    metadata['truncated'] = True
+                    break
+            
+            if hasattr(reader, 'metadata') and reader.metadata:
+                metadata.update({
+                    'title': reader.metadata.get('/Title', 'Unknown'),
+                    'author': reader.metadata.get('/Author', 'Unknown'),
+                    'subject': reader.metadata.get('/Subject', 'Unknown')
+                })
+        
+        return "\n".join(parts), metadata
+    
+    def _process_spreadsheet(self, file_path: str, file_size: Optional[int] = None) -> Dict:
         """Process spreadsheet files"""
         try:
-            workbook = openpyxl.load_workbook(file_path)
-            
-            metadata = {
-                'sheets': workbook.sheetnames,
-                'total_sheets': len(workbook.sheetnames)
-            }
-            
-            # Process first sheet for preview
-            first_sheet = workbook.active
-            
-            # Get data preview (first 10 rows, 5 columns)
-            data_preview = []
-            max_row = min(10, first_sheet.max_row)
-            max_col = min(5, first_sheet.max_column)
-            
-            for row in range(1, max_row + 1):
-                row_data = []
-                for col in range(1, max_col + 1):
-                    cell_value = first_sheet.cell(row=row, column=col).value
-                    row_data.append(str(cell_value) if cell_value is not None else "")
-                data_preview.append(row_data)
-            
-            metadata.update({
-                'rows': first_sheet.max_row,
-                'columns': first_sheet.max_column,
-                'size_kb': round(os.path.getsize(file_path) / 1024, 2)
-            })
+            # Read-only mode streams rows instead of building every cell; data_only skips formulas
+            workbook = _lazy_openpyxl().load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                metadata = {
+                    'sheets': workbook.sheetnames,
+                    'total_sheets': len(workbook.sheetnames)
+                }
+                
+                # Process first sheet for preview
+                first_sheet = workbook.active
+                
+                # Get data preview (first 10 rows, 5 columns)
+                data_preview = [
+                    [str(value) if value is not None else "" for value in row]
+                    for row in first_sheet.iter_rows(max_row=10, max_col=5, values_only=True)
+                ]
+                
+                # Size comes from the sheet's stored dimensions; only files without them are scanned
+                dimensions = first_sheet.calculate_dimension(force=True)
+                
+                metadata.update({
+                    'rows': first_sheet.max_row,
+                    'columns': first_sheet.max_column,
+                    'dimensions': dimensions,
+                    'size_kb': round(self._file_size(file_path, file_size) / 1024, 2)
+                })
+            finally:
+                # Read-only workbooks keep the file open until closed
+                workbook.close()
             
             return {
                 'type': 'spreadsheet',
@@ -264,22 +551,25 @@ class FileProcessor:
             logging.error(f"Error processing spreadsheet: {e}")
             return {'content': f"Error reading spreadsheet: {str(e)}"}
     
-    def _process_archive(self, file_path: str) -> Dict:
+    def _process_archive(self, file_path: str, file_size: Optional[int] = None) -> Dict:
         """Process archive files (ZIP, etc.)"""
         try:
             if file_path.endswith('.zip'):
                 with zipfile.ZipFile(file_path, 'r') as zip_file:
-                    file_list = zip_file.namelist()
+                    # infolist() is the archive's own entry list, so nothing is copied
+                    # except the names shown
+                    entries = zip_file.infolist()
+                    total_files = len(entries)
                     
                     metadata = {
-                        'total_files': len(file_list),
-                        'files': file_list[:20],  # Show first 20 files
-                        'size_mb': round(os.path.getsize(file_path) / (1024*1024), 2)
+                        'total_files': total_files,
+                        'files': [entry.filename for entry in islice(entries, 20)],  # Show first 20 files
+                        'size_mb': round(self._file_size(file_path, file_size) / (1024*1024), 2)
                     }
                     
                     return {
                         'type': 'archive',
-                        'content': f"ZIP archive containing {len(file_list)} files",
+                        'content': f"ZIP archive containing {total_files} files",
                         'metadata': metadata
                     }
             
@@ -289,10 +579,15 @@ class FileProcessor:
             logging.error(f"Error processing archive: {e}")
             return {'content': f"Error reading archive: {str(e)}"}
     
-    def _process_video(self, file_path: str) -> Dict:
+    def _process_video(self, file_path: str, inline: bool = False, file_size: Optional[int] = None) -> Dict:
         """Process video files with OpenCV"""
+        cv2 = _lazy_cv2()
         try:
-            cap = cv2.VideoCapture(file_path)
+            # The FFmpeg backend seeks to the nearest keyframe by timestamp; fall back to
+            # whichever backend OpenCV picks if it can't open the file
+            cap = cv2.VideoCapture(file_path, cv2.CAP_FFMPEG)
+            if not cap.isOpened():
+                cap = cv2.VideoCapture(file_path)
             
             # Video metadata
             fps = cap.get(cv2.CAP_PROP_FPS)
@@ -306,11 +601,11 @@ class FileProcessor:
                 'fps': round(fps, 2),
                 'resolution': f"{width}x{height}",
                 'total_frames': frame_count,
-                'size_mb': round(os.path.getsize(file_path) / (1024*1024), 2)
+                'size_mb': round(self._file_size(file_path, file_size) / (1024*1024), 2)
             }
             
             # Extract a few frames for preview
-            frame_thumbnails = self._extract_video_frames(cap, 3)
+            frame_thumbnails = self._extract_video_frames(cap, 3, duration * 1000, inline)
             metadata['preview_frames'] = frame_thumbnails
             
             cap.release()
@@ -325,25 +620,33 @@ class FileProcessor:
             logging.error(f"Error processing video: {e}")
             return {'content': f"Error analyzing video: {str(e)}"}
     
-    def process_camera_capture(self, image_data: str) -> Dict:
-        """Process camera captured image"""
+    def process_camera_capture(self, image_data: str, save: bool = True) -> Dict:
+        """
+        Process camera captured image
+        
+        The image is decoded in memory; it is only written to the uploads folder when save is set.
+        Unsaved captures get their thumbnail inline as a data URL.
+        """
+        cv2 = _lazy_cv2()
         try:
-            # Decode base64 image
-            image_data = image_data.split(',')[1] if ',' in image_data else image_data
-            image_bytes = base64.b64decode(image_data)
+            # Decode base64 image, skipping any data-URL prefix without splitting the string
+            comma = image_data.find(',')
+            image_bytes = base64.b64decode(image_data[comma + 1:] if comma != -1 else image_data)
+            img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
             
-            # Save captured image
-            import uuid
             filename = f"camera_capture_{uuid.uuid4().hex}.jpg"
             file_path = os.path.join(self.upload_dir, filename)
             
-            with open(file_path, 'wb') as f:
-                f.write(image_bytes)
+            if save:
+                # Save captured image
+                with open(file_path, 'wb') as f:
+                    f.write(image_bytes)
             
             # Process the captured image
-            result = self._process_image(file_path)
+            result = self._process_image_from_array(img, file_path, len(image_bytes), inline=not save)
             result['source'] = 'camera_capture'
-            result['filename'] = filename
+            if save:
+                result['filename'] = filename
             
             return result
             
@@ -355,41 +658,52 @@ class FileProcessor:
             }
     
     def _get_dominant_colors(self, img: np.ndarray, k: int = 5) -> List[List[int]]:
-        """Extract dominant colors using K-means clustering"""
+        """Extract dominant BGR colors as the centers of the most populated color bins"""
         try:
-            # Reshape image to be a list of pixels
-            data = img.reshape((-1, 3))
-            data = np.float32(data)
-            
-            # Apply K-means
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
-            _, labels, centers = cv2.kmeans(data, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-            
-            # Convert to int and return
-            centers = np.uint8(centers)
-            return centers.tolist()
+            # Pack each pixel's quantized B, G, R into one bin index
+            shift = 8 - COLOR_BIN_BITS
+            levels = 1 << COLOR_BIN_BITS
+            data = img.reshape((-1, 3)) >> shift
+            packed = (data[:, 0].astype(np.uint16)
+                      | (data[:, 1].astype(np.uint16) << COLOR_BIN_BITS)
+                      | (data[:, 2].astype(np.uint16) << (2 * COLOR_BIN_BITS)))
+            counts = np.bincount(packed, minlength=levels ** 3)
+            
+            # Top k bins, most common first, ignoring empty bins
+            top = np.argpartition(counts, -k)[-k:]
+            top = top[np.argsort(counts[top])[::-1]]
+            top = top[counts[top] > 0]
+            
+            # Decode bins back to the BGR value at each bin's center
+            mask = levels - 1
+            half = 1 << (shift - 1)
+            centers = np.stack([(top & mask) << shift,
+                                ((top >> COLOR_BIN_BITS) & mask) << shift,
+                                ((top >> (2 * COLOR_BIN_BITS)) & mask) << shift], axis=1) | half
+            return centers.astype(np.uint8).tolist()
             
         except:
             return [[128, 128, 128]]  # Default gray if analysis fails
     
-    def _detect_faces(self, img: np.ndarray) -> int:
-        """Detect faces in image using OpenCV"""
+    def _detect_faces(self, gray: np.ndarray) -> int:
+        """Detect faces in a grayscale image using OpenCV"""
+        face_cascade = _load_face_cascade()
+        if face_cascade is None:
+            return 0
+        
         try:
-            # Load face cascade classifier
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            with self._face_lock:
+                faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
             
             return len(faces)
             
         except:
             return 0
     
-    def _detect_edges(self, img: np.ndarray) -> int:
-        """Detect edges in image"""
+    def _detect_edges(self, gray: np.ndarray) -> int:
+        """Detect edges in a grayscale image"""
+        cv2 = _lazy_cv2()
         try:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             edges = cv2.Canny(gray, 100, 200)
             edge_count = np.count_nonzero(edges)
             
@@ -398,45 +712,86 @@ class FileProcessor:
         except:
             return 0
     
-    def _generate_thumbnail(self, file_path: str, size: Tuple[int, int] = (200, 200)) -> str:
-        """Generate thumbnail for image"""
+    def _generate_thumbnail(self, img_bgr: np.ndarray, file_path: str, size: Tuple[int, int] = (200, 200),
+                            inline: bool = False) -> str:
+        """Generate thumbnail from an already decoded image, fitting it within size
+        
+        Returns the thumbnail's path, or a JPEG data URL without touching disk when inline is set.
+        """
+        cv2 = _lazy_cv2()
         try:
-            img = Image.open(file_path)
-            img.thumbnail(size, Image.Resampling.LANCZOS)
+            # Shrink only, keeping the aspect ratio
+            height, width = img_bgr.shape[:2]
+            scale = min(size[0] / width, size[1] / height, 1.0)
+            thumb = img_bgr
+            if scale < 1.0:
+                thumb = cv2.resize(img_bgr, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            
+            if inline:
+                return self._jpeg_data_url(thumb)
             
             # Save thumbnail
             filename = os.path.basename(file_path)
             name, ext = os.path.splitext(filename)
             thumbnail_filename = f"{name}_thumb{ext}"
             thumbnail_path = os.path.join(self.upload_dir, "processed", thumbnail_filename)
+            if not cv2.haveImageWriter(thumbnail_path):
+                # OpenCV cannot write some formats (e.g. GIF); fall back to JPEG
+                thumbnail_path = os.path.join(self.upload_dir, "processed", f"{name}_thumb.jpg")
             
-            img.save(thumbnail_path)
+            if not cv2.imwrite(thumbnail_path, thumb, [cv2.IMWRITE_JPEG_QUALITY, 85]):
+                raise ValueError(f"could not write {thumbnail_path}")
             return thumbnail_path
             
         except Exception as e:
             logging.error(f"Error generating thumbnail: {e}")
             return file_path
     
-    def _extract_video_frames(self, cap: cv2.VideoCapture, num_frames: int = 3) -> List[str]:
-        """Extract frames from video for preview"""
+    def _jpeg_data_url(self, img: np.ndarray) -> str:
+        """Encode an image as a base64 JPEG data URL"""
+        cv2 = _lazy_cv2()
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, INLINE_JPEG_QUALITY])
+        if not ok:
+            raise ValueError("could not encode image as JPEG")
+        return 'data:image/jpeg;base64,' + base64.b64encode(buf).decode('ascii')
+    
+    def _extract_video_frames(self, cap: 'cv2.VideoCapture', num_frames: int = 3,
+                              duration_ms: float = 0, inline: bool = False) -> List[str]:
+        """Extract frames from video for preview, as file paths or JPEG data URLs when inline"""
+        cv2 = _lazy_cv2()
         try:
             frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            frame_paths = []
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, VIDEO_FRAME_JPEG_QUALITY]
+            pending = []
             
+            # VideoCapture is not thread-safe, so frames are read here; each one is
+            # encoded on the pool while the next is being decoded
             for i in range(num_frames):
-                frame_pos = int((i + 1) * frame_count / (num_frames + 1))
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
+                if duration_ms > 0:
+                    # Seeking by timestamp jumps to a keyframe instead of decoding every
+                    # frame up to an exact frame index
+                    cap.set(cv2.CAP_PROP_POS_MSEC, (i + 1) * duration_ms / (num_frames + 1))
+                else:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, int((i + 1) * frame_count / (num_frames + 1)))
                 
                 ret, frame = cap.read()
-                if ret:
+                if ret and inline:
+                    pending.append((None, _encode_executor.submit(self._jpeg_data_url, frame)))
+                elif ret:
                     # Save frame
-                    import uuid
                     frame_filename = f"video_frame_{uuid.uuid4().hex}.jpg"
                     frame_path = os.path.join(self.upload_dir, "processed", frame_filename)
-                    cv2.imwrite(frame_path, frame)
-                    frame_paths.append(frame_path)
-            
-            return frame_paths
+                    pending.append((frame_path, _encode_executor.submit(cv2.imwrite, frame_path, frame,
+                                                                        encode_params)))
+            
+            # Saved frames resolve to imwrite's success flag, inline frames to their data URL
+            frames = []
+            for frame_path, future in pending:
+                encoded = future.result()
+                if encoded:
+                    frames.append(frame_path or encoded)
+            return frames
             
         except Exception as e:
             logging.error(f"Error extracting video frames: {e}")
@@ -1,11 +1,24 @@
 import json
+import hashlib
+import importlib
 import logging
 import os
+import random
+import sqlite3
+import threading
+import time
+import numpy as np
 import requests
+from cachetools import TTLCache
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache, wraps
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import google.generativeai as genai
 from google.genai import types
 from pydantic import BaseModel
 import base64
+from services.circuit_breaker import CircuitBreaker
 
 # This API key is from Gemini Developer API Key, not vertex AI API Key
 try:
@@ -17,24 +30,357 @@ try:
 except:
     client = None
 
+# Gemini model used for text responses
+GEMINI_TEXT_MODEL = "gemini-2.5-flash"
+
+# Hugging Face models tried in order for text and for images
+HF_TEXT_MODELS = (
+    "microsoft/DialoGPT-medium",
+    "facebook/blenderbot-400M-distill",
+    "google/flan-t5-base"
+)
+HF_IMAGE_MODELS = (
+    "stabilityai/stable-diffusion-2-1",
+    "runwayml/stable-diffusion-v1-5",
+    "CompVis/stable-diffusion-v1-4"
+)
+
+# Prompt templates, filled in with str.format. The fixed instructions come first and
+# the per-request text last, so consecutive prompts share a prefix the provider can cache
+FB_PROMPT_TMPL = """Create an engaging Facebook post about the topic below.
+
+Requirements:
+- Keep it under 280 characters
+- Make it engaging and social media friendly
+- Include relevant emojis
+- Make it sound natural and personal
+{hashtags_line}
+
+Topic: {topic}
+"""
+
+REPLY_TMPL = """Generate a helpful and professional auto-reply for the message below.
+
+Requirements:
+- Keep it brief and friendly
+- Acknowledge their message
+- Be helpful and professional
+- Don't make promises you can't keep
+- Sound natural and human-like
+
+Context: {context}
+Original message: "{original_message}"
+"""
+
+# Fixed first part of every Gemini image request; the image description is a separate part
+GEMINI_IMAGE_STYLE_PREFIX = """Create a high-quality, visually appealing image of the description that follows.
+
+Style requirements:
+- Professional and polished look
+- Good composition and lighting
+- Vibrant but not oversaturated colors
+- Clear and detailed
+"""
+
+# Used when no AI service produces a post or reply
+FALLBACK_POSTS = (
+    "🌟 Excited to share something about {topic}! What are your thoughts? Share in the comments below! 💬✨ #thoughts #share #community",
+    "💡 {topic} is such an interesting topic! I'd love to hear your perspectives. Drop a comment! 👇 #discussion #ideas #community",
+    "🚀 Just thinking about {topic}... Amazing how much there is to explore! What fascinates you most? 🤔💭 #explore #learn #curious"
+)
+FALLBACK_REPLIES = (
+    "Thank you for your message! I've received it and will get back to you as soon as possible. Have a great day! 😊",
+    "Hi there! Thanks for reaching out. I'll review your message and respond shortly. Appreciate your patience! 🙏",
+    "Hello! I've received your message and will get back to you soon. Thanks for contacting me! 💌"
+)
+
+# Returned when every text provider fails
+FALLBACK_TEXT_RESPONSE = "I'm currently unable to generate a response. Please check your AI API keys in settings or try again later."
+
+# Text responses per prompt hash; repeated prompts within 30 minutes skip the AI call
+_text_cache = TTLCache(maxsize=1024, ttl=1800)
+_text_cache_lock = threading.Lock()
+
+# Text responses persisted across restarts and shared by worker processes;
+# anchored to the app root rather than the working directory
+TEXT_CACHE_PATH = os.environ.get(
+    "TEXT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'gemini.sqlite')
+)
+
+class TextCache:
+    """
+    SQLite-backed text response cache with a time-to-live and a row limit
+    WAL mode lets other worker processes read while one of them writes
+    """
+    
+    # Expired and excess rows are deleted on open and then every this many puts
+    PRUNE_EVERY = 100
+    
+    def __init__(self, path: str = TEXT_CACHE_PATH, ttl: float = 1800, max_rows: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._conn = None
+        self._opened = False
+        self._puts = 0
+        self._lock = threading.Lock()
+    
+    def _connection(self):
+        """Open the database on first use; None if it cannot be opened. Caller holds the lock"""
+        if not self._opened:
+            self._opened = True
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS kv(key BLOB PRIMARY KEY, created REAL, value TEXT)")
+                conn.execute("CREATE INDEX IF NOT EXISTS kv_created ON kv(created)")
+                self._prune(conn)
+                self._conn = conn
+            except sqlite3.Error as e:
+                logging.error(f"Error opening text cache {self.path}: {e}")
+        return self._conn
+    
+    def _prune(self, conn):
+        """Delete expired rows, then the oldest rows beyond max_rows"""
+        conn.execute("DELETE FROM kv WHERE created <= ?", (time.time() - self.ttl,))
+        conn.execute("DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                     (self.max_rows,))
+    
+    def get(self, key: bytes):
+        """Cached value for key if it has not expired, else None"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                if conn is None:
+                    return None
+                row = conn.execute("SELECT value FROM kv WHERE key = ? AND created > ?",
+                                   (key, time.time() - self.ttl)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logging.error(f"Error reading text cache: {e}")
+            return None
+    
+    def put(self, key: bytes, value: str):
+        try:
+            with self._lock:
+                conn = self._connection()
+                if conn is None:
+                    return
+                conn.execute("INSERT OR REPLACE INTO kv(key, created, value) VALUES (?, ?, ?)",
+                             (key, time.time(), value))
+                self._puts += 1
+                if self._puts % self.PRUNE_EVERY == 0:
+                    self._prune(conn)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing text cache: {e}")
+
+# Opened lazily by the first get or put
+_disk_text_cache = TextCache()
+
+def _text_cache_key(prompt: str) -> bytes:
+    """Cache key for a text prompt"""
+    return hashlib.blake2b(f"{GEMINI_TEXT_MODEL}\0{prompt}".encode()).digest()
+
+# Sentence-embedding model for the semantic cache, and the cosine similarity at which
+# a cached response is reused for a reworded prompt
+SEMANTIC_CACHE_MODEL = 'all-MiniLM-L6-v2'
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+@lru_cache(maxsize=1)
+def _load_embedder():
+    """Load the embedding model on first use; None when sentence-transformers is missing"""
+    try:
+        sentence_transformers = importlib.import_module('sentence_transformers')
+    except ImportError:
+        # Without sentence-transformers only the exact-match cache is used
+        logging.warning("sentence-transformers not installed; semantic cache disabled")
+        return None
+    return sentence_transformers.SentenceTransformer(SEMANTIC_CACHE_MODEL)
+
+class SemanticCache:
+    """
+    Reuse responses for prompts that are worded differently but mean the same
+    Normalized embeddings are kept in one matrix, so a lookup is a single matrix-vector product
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 1800, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._embeddings = None  # float32 [maxsize, dim], allocated on the first insert
+        self._created = np.zeros(maxsize)
+        self._responses = [None] * maxsize
+        self._count = 0
+        self._next = 0  # Slot overwritten next once the cache is full
+        self._lock = threading.Lock()
+    
+    def embed(self, prompt: str):
+        """Normalized embedding of prompt, or None if no embedding model is available"""
+        embedder = _load_embedder()
+        if embedder is None:
+            return None
+        return embedder.encode(prompt, normalize_embeddings=True).astype(np.float32)
+    
+    def get(self, embedding):
+        """Response of the most similar unexpired prompt, if similar enough"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            scores = self._embeddings[:self._count] @ embedding
+            scores[self._created[:self._count] < time.time() - self.ttl] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return self._responses[best]
+            return None
+    
+    def put(self, embedding, response: str):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.maxsize, embedding.shape[0]), np.float32)
+            slot = self._next
+            self._embeddings[slot] = embedding
+            self._created[slot] = time.time()
+            self._responses[slot] = response
+            self._next = (slot + 1) % self.maxsize
+            self._count = min(self._count + 1, self.maxsize)
+
+# Opt-in, since it needs sentence-transformers and a reworded prompt gets the earlier answer
+_semantic_cache = SemanticCache() if os.environ.get('SEMANTIC_CACHE') else None
+
+# Image directories already created by this process
+_ensured_dirs = set()
+
+def _ensure_dir(path):
+    """Create a directory once per process instead of on every image request"""
+    if path not in _ensured_dirs:
+        os.makedirs(path, exist_ok=True)
+        _ensured_dirs.add(path)
+
+# Futures of text prompts currently being generated, by cache key; concurrent identical
+# prompts wait on the first caller's request instead of sending their own
+_inflight_text = {}
+_inflight_lock = threading.Lock()
+
+# Runs the text providers side by side for hedged requests
+_hedge_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='gemini-hedge')
+
+# Posts to every Hugging Face model at once; separate from the hedge pool, whose
+# tasks wait on these
+_hf_probe_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='hf-probe')
+
+# Provider helpers that fail 3 times in a row are skipped for 60 seconds
+_breakers = {}
+
+def _provider_failed(result):
+    """Whether a _try_* helper's result is a failure: None or (False, message)"""
+    return result is None or (isinstance(result, tuple) and not result[0])
+
+def _circuit(name, api_key_env, skipped=None):
+    """Route a _try_* helper through a circuit breaker; skipped is returned while it is open
+    
+    Calls are passed straight through while api_key_env is unset, since a provider
+    without a key fails instantly anyway.
+    """
+    breaker = _breakers[name] = CircuitBreaker(name, fail_max=3, reset_timeout=60,
+                                               is_failure=_provider_failed)
+    
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not os.getenv(api_key_env):
+                return func(*args, **kwargs)
+            result = breaker.call(func, *args, **kwargs)
+            # breaker.call returns None while open; image helpers never return None themselves
+            return skipped if result is None else result
+        return wrapper
+    return decorator
+
 class GeminiService:
     def __init__(self):
         self.client = client
+        # Keep connections to the provider APIs alive across calls; hedged requests and
+        # parallel model probes share the pool
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+        ))
     
-    def generate_text_response(self, prompt):
-        """Generate text response using multiple AI services with fallback"""
+    def generate_text_response(self, prompt, nocache=False, hedge=False):
+        """Generate text response using multiple AI services with fallback
         
+        Responses are cached by prompt for 30 minutes unless nocache is set. With the
+        SEMANTIC_CACHE environment variable set, reworded prompts are matched as well.
+        hedge asks all providers at once and takes the first answer, for interactive
+        requests where latency matters more than the extra API calls. A prompt that is
+        already being generated on another thread shares that call's result.
+        """
+        key = _text_cache_key(prompt)
+        embedding = None
+        if not nocache:
+            cached = self._cached_text(key)
+            if cached is not None:
+                return cached
+            
+            if _semantic_cache is not None:
+                embedding = _semantic_cache.embed(prompt)
+                cached = _semantic_cache.get(embedding) if embedding is not None else None
+                if cached is not None:
+                    return cached
+        
+        with _inflight_lock:
+            inflight = _inflight_text.get(key)
+            if inflight is None:
+                future = _inflight_text[key] = Future()
+        if inflight is not None:
+            return inflight.result()
+        
+        try:
+            if hedge:
+                response = self._generate_text_hedged(prompt)
+            else:
+                response = self._generate_text_uncached(prompt)
+            
+            # The fallback message is not cached so the next call retries the providers
+            if response != FALLBACK_TEXT_RESPONSE:
+                self._store_text(key, response)
+                if embedding is not None:
+                    _semantic_cache.put(embedding, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight_text[key]
+    
+    def _cached_text(self, key):
+        """Look a response up in memory, then on disk"""
+        with _text_cache_lock:
+            cached = _text_cache.get(key)
+        if cached is None:
+            cached = _disk_text_cache.get(key)
+            if cached is not None:
+                with _text_cache_lock:
+                    _text_cache[key] = cached
+        return cached
+    
+    def _store_text(self, key, response):
+        """Cache a response in memory and on disk"""
+        with _text_cache_lock:
+            _text_cache[key] = response
+        _disk_text_cache.put(key, response)
+    
+    def _generate_text_uncached(self, prompt):
+        """Try each text provider in turn"""
         # Try Gemini API first
-        if self.client:
-            try:
-                response = self.client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt
-                )
-                if response.text:
-                    return response.text
-            except Exception as e:
-                logging.warning(f"Gemini API failed: {e}")
+        gemini_response = self._try_gemini_text(prompt)
+        if gemini_response:
+            return gemini_response
         
         # Try Hugging Face API
         hf_response = self._try_huggingface_text(prompt)
@@ -47,8 +393,46 @@ class GeminiService:
             return aiml_response
         
         # Fallback response
-        return "I'm currently unable to generate a response. Please check your AI API keys in settings or try again later."
+        return FALLBACK_TEXT_RESPONSE
+    
+    def _generate_text_hedged(self, prompt):
+        """Ask every text provider at once and return the first usable answer"""
+        futures = [_hedge_executor.submit(provider, prompt)
+                   for provider in (self._try_gemini_text, self._try_huggingface_text, self._try_aiml_text)]
+        try:
+            for future in as_completed(futures):
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logging.warning(f"Text provider failed: {e}")
+                    continue
+                if response:
+                    return response
+            return FALLBACK_TEXT_RESPONSE
+        finally:
+            # Calls already in flight finish in the background; their results are discarded
+            for future in futures:
+                future.cancel()
     
+    @_circuit('gemini-text', 'GEMINI_API_KEY')
+    def _try_gemini_text(self, prompt):
+        """Try Gemini API for text generation"""
+        if not self.client:
+            return None
+        
+        try:
+            response = self.client.models.generate_content(
+                model=GEMINI_TEXT_MODEL,
+                contents=prompt
+            )
+            if response.text:
+                return response.text
+        except Exception as e:
+            logging.warning(f"Gemini API failed: {e}")
+        
+        return None
+    
+    @_circuit('huggingface-text', 'HUGGINGFACE_API_KEY')
     def _try_huggingface_text(self, prompt):
         """Try Hugging Face API for text generation"""
         try:
@@ -58,36 +442,59 @@ class GeminiService:
                 
             headers = {"Authorization": f"Bearer {hf_key}"}
             
-            # Try multiple models
-            models = [
-                "microsoft/DialoGPT-medium",
-                "facebook/blenderbot-400M-distill",
-                "google/flan-t5-base"
-            ]
-            
-            for model in models:
-                try:
-                    response = requests.post(
-                        f"https://api-inference.huggingface.co/models/{model}",
-                        headers=headers,
-                        json={"inputs": prompt},
-                        timeout=10
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        if isinstance(result, list) and len(result) > 0:
-                            generated_text = result[0].get('generated_text', '')
-                            if generated_text and len(generated_text.strip()) > 0:
-                                return generated_text
-                except:
-                    continue
+            # Ask all models at once; the first usable answer wins
+            return self._first_hf_result(
+                HF_TEXT_MODELS, headers, prompt, 10,
+                lambda response: self._hf_generated_text(response.json())
+            )
                     
         except Exception as e:
             logging.warning(f"Hugging Face API failed: {e}")
         
         return None
     
+    def _first_hf_result(self, models, headers, prompt, timeout, parse):
+        """POST prompt to every model in parallel and return the first non-empty parse(response)
+        
+        Worst-case latency is one timeout rather than one per model.
+        """
+        futures = [_hf_probe_executor.submit(self._post_hf_model, model, headers, prompt, timeout, parse)
+                   for model in models]
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if result:
+                    return result
+            return None
+        finally:
+            # Slower models' requests finish in the background; their results are discarded
+            for future in futures:
+                future.cancel()
+    
+    def _post_hf_model(self, model, headers, prompt, timeout, parse):
+        """Run prompt on one Hugging Face model; parse(response) on success, else None"""
+        response = self.session.post(
+            f"https://api-inference.huggingface.co/models/{model}",
+            headers=headers,
+            json={"inputs": prompt},
+            timeout=timeout
+        )
+        if response.status_code == 200:
+            return parse(response)
+        return None
+    
+    def _hf_generated_text(self, result):
+        """Generated text from a Hugging Face inference response, or None if empty"""
+        if isinstance(result, list) and len(result) > 0:
+            generated_text = result[0].get('generated_text', '')
+            if generated_text and len(generated_text.strip()) > 0:
+                return generated_text
+        return None
+    
+    @_circuit('aiml-text', 'AIML_API_KEY')
     def _try_aiml_text(self, prompt):
         """Try AIML API for text generation"""
         try:
@@ -108,7 +515,7 @@ class GeminiService:
                 "max_tokens": 500
             }
             
-            response = requests.post(
+            response = self.session.post(
                 "https://api.aimlapi.com/v1/chat/completions",
                 headers=headers,
                 json=data,
@@ -125,39 +532,33 @@ class GeminiService:
         
         return None
     
-    def generate_facebook_post(self, topic, include_hashtags=True):
-        """Generate Facebook post content using multiple AI services"""
-        prompt = f"""Create an engaging Facebook post about: {topic}
+    def generate_facebook_post(self, topic, include_hashtags=True, fallback=True):
+        """Generate Facebook post content using multiple AI services
         
-        Requirements:
-        - Keep it under 280 characters
-        - Make it engaging and social media friendly
-        - Include relevant emojis
-        {'- Add 3-5 relevant hashtags at the end' if include_hashtags else '- No hashtags needed'}
-        - Make it sound natural and personal
+        With fallback=False, None is returned instead of a canned post when every service fails.
         """
+        prompt = FB_PROMPT_TMPL.format(
+            topic=topic,
+            hashtags_line='- Add 3-5 relevant hashtags at the end' if include_hashtags else '- No hashtags needed'
+        )
         
         # Use the same fallback system as text generation
         response = self.generate_text_response(prompt)
         
-        if response and not response.startswith("I'm currently unable"):
+        if response and response != FALLBACK_TEXT_RESPONSE:
             return response
         
-        # Fallback post content
-        fallback_posts = [
-            f"🌟 Excited to share something about {topic}! What are your thoughts? Share in the comments below! 💬✨ #thoughts #share #community",
-            f"💡 {topic} is such an interesting topic! I'd love to hear your perspectives. Drop a comment! 👇 #discussion #ideas #community",
-            f"🚀 Just thinking about {topic}... Amazing how much there is to explore! What fascinates you most? 🤔💭 #explore #learn #curious"
-        ]
-        
-        import random
-        return random.choice(fallback_posts)
+        return self.fallback_facebook_post(topic) if fallback else None
+    
+    def fallback_facebook_post(self, topic):
+        """Canned post content for when no AI service is available"""
+        return random.choice(FALLBACK_POSTS).format(topic=topic)
     
     def generate_image(self, prompt, image_path):
         """Generate image using multiple AI services with fallback"""
         
         # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        _ensure_dir(os.path.dirname(image_path))
         
         # Try Gemini API first
         if self.client:
@@ -182,18 +583,15 @@ class GeminiService:
         
         return False, "All image generation services failed. Please check your API keys in settings."
     
+    @_circuit('gemini-image', 'GEMINI_API_KEY', (False, "Gemini API skipped after repeated failures"))
     def _try_gemini_image(self, prompt, image_path):
         """Try Gemini API for image generation"""
         try:
             # Enhance the prompt for better image generation
-            enhanced_prompt = f"""Create a high-quality, visually appealing image: {prompt}
-            
-            Style requirements:
-            - Professional and polished look
-            - Good composition and lighting
-            - Vibrant but not oversaturated colors
-            - Clear and detailed
-            """
+            enhanced_prompt = [
+                types.Part.from_text(text=GEMINI_IMAGE_STYLE_PREFIX),
+                types.Part.from_text(text=f"Description: {prompt}")
+            ]
             
             response = self.client.models.generate_content(
                 # IMPORTANT: only this gemini model supports image generation
@@ -228,6 +626,7 @@ class GeminiService:
             logging.warning(f"Gemini image generation failed: {e}")
             return False, f"Gemini API error: {str(e)}"
     
+    @_circuit('deepai-image', 'DEEPAI_API_KEY', (False, "DeepAI skipped after repeated failures"))
     def _try_deepai_image(self, prompt, image_path):
         """Try DeepAI for image generation (FREE)"""
         try:
@@ -235,7 +634,7 @@ class GeminiService:
             if not deepai_key:
                 return False, "DeepAI API key not found"
             
-            response = requests.post(
+            response = self.session.post(
                 "https://api.deepai.org/api/text2img",
                 data={
                     'text': prompt,
@@ -250,7 +649,7 @@ class GeminiService:
                 
                 if image_url:
                     # Download the image
-                    img_response = requests.get(image_url, timeout=30)
+                    img_response = self.session.get(image_url, timeout=30)
                     if img_response.status_code == 200:
                         with open(image_path, 'wb') as f:
                             f.write(img_response.content)
@@ -263,6 +662,7 @@ class GeminiService:
             logging.warning(f"DeepAI image generation failed: {e}")
             return False, f"DeepAI error: {str(e)}"
     
+    @_circuit('huggingface-image', 'HUGGINGFACE_API_KEY', (False, "Hugging Face skipped after repeated failures"))
     def _try_huggingface_image(self, prompt, image_path):
         """Try Hugging Face for image generation (FREE)"""
         try:
@@ -272,29 +672,14 @@ class GeminiService:
             
             headers = {"Authorization": f"Bearer {hf_key}"}
             
-            # Try multiple Stable Diffusion models
-            models = [
-                "stabilityai/stable-diffusion-2-1",
-                "runwayml/stable-diffusion-v1-5",
-                "CompVis/stable-diffusion-v1-4"
-            ]
-            
-            for model in models:
-                try:
-                    response = requests.post(
-                        f"https://api-inference.huggingface.co/models/{model}",
-                        headers=headers,
-                        json={"inputs": prompt},
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        with open(image_path, 'wb') as f:
-                            f.write(response.content)
-                        logging.info(f"Image saved via Hugging Face: {image_path}")
-                        return True, f"Image generated successfully via Hugging Face (FREE)"
-                except:
-                    continue
+            # Try all Stable Diffusion models at once; only the first image is written
+            image_data = self._first_hf_result(HF_IMAGE_MODELS, headers, prompt, 30,
+                                               lambda response: response.content)
+            if image_data:
+                with open(image_path, 'wb') as f:
+                    f.write(image_data)
+                logging.info(f"Image saved via Hugging Face: {image_path}")
+                return True, f"Image generated successfully via Hugging Face (FREE)"
             
             return False, "All Hugging Face models failed"
             
@@ -326,7 +711,7 @@ class GeminiService:
                 }
             }
             
-            response = requests.post(
+            response = self.session.post(
                 "https://api.replicate.com/v1/models/black-forest-labs/flux-schnell/predictions",
                 headers=headers,
                 json=data,
@@ -347,34 +732,16 @@ class GeminiService:
     
     def generate_auto_reply(self, original_message, context="general"):
         """Generate intelligent auto-reply for messages using multiple AI services"""
-        prompt = f"""Generate a helpful and professional auto-reply for this message:
-        
-        Original message: "{original_message}"
-        Context: {context}
-        
-        Requirements:
-        - Keep it brief and friendly
-        - Acknowledge their message
-        - Be helpful and professional
-        - Don't make promises you can't keep
-        - Sound natural and human-like
-        """
+        prompt = REPLY_TMPL.format(original_message=original_message, context=context)
         
         # Use the same fallback system as text generation
         response = self.generate_text_response(prompt)
         
-        if response and not response.startswith("I'm currently unable"):
+        if response and response != FALLBACK_TEXT_RESPONSE:
             return response
         
         # Fallback auto-reply messages
-        fallback_replies = [
-            "Thank you for your message! I've received it and will get back to you as soon as possible. Have a great day! 😊",
-            "Hi there! Thanks for reaching out. I'll review your message and respond shortly. Appreciate your patience! 🙏",
-            "Hello! I've received your message and will get back to you soon. Thanks for contacting me! 💌"
-        ]
-        
-        import random
-        return random.choice(fallback_replies)
+        return random.choice(FALLBACK_REPLIES)
 
 # Global Gemini service instance
 gemini_service = GeminiService()
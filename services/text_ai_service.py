@@ -1,9 +1,16 @@
 import os
+import time
 import logging
 import json
+import threading
 from typing import Dict, List, Optional, Tuple
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
+from services.circuit_breaker import CircuitBreaker
+
+# Shared pool used to query several providers at once
+_provider_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ai-provider')
 
 class TextAIService:
     """
@@ -19,6 +26,12 @@ class TextAIService:
             'aiml': self._use_aiml
         }
         
+        # Providers that keep failing are short-circuited instead of awaited on every request
+        self.breakers = {
+            provider: CircuitBreaker(provider, fail_max=5, reset_timeout=30)
+            for provider in self.providers
+        }
+        
         # Content type templates
         self.content_templates = {
             'social_post': {
@@ -273,6 +286,61 @@ REQUIREMENTS:
             return bool(os.getenv('AIML_API_KEY'))
         return False
     
+    def race_providers(self, prompt: str, max_length: int,
+                       providers: Tuple[str, ...] = ('gemini', 'openai', 'huggingface'),
+                       timeout: float = 8.0, grace: float = 2.0) -> Optional[str]:
+        """
+        Query available providers in parallel and return the most preferred non-empty response
+        Providers are listed in order of preference; for the first grace seconds an answer is only
+        used once every provider ahead of it has come back empty, after that the first answer wins
+        """
+        started = threading.Event()
+        
+        def call(provider):
+            started.set()
+            return self.breakers[provider].call(self.providers[provider], prompt, max_length)
+        
+        futures = [_provider_executor.submit(call, provider)
+                   for provider in providers if self._is_provider_available(provider)]
+        if not futures:
+            return None
+        
+        # Time spent queued behind other requests' calls does not count against the deadline
+        started.wait()
+        start = time.monotonic()
+        deadline, grace_end = start + timeout, start + grace
+        pending = set(futures)
+        results = {}
+        
+        try:
+            while True:
+                for future in futures:
+                    if future in pending:
+                        if time.monotonic() < grace_end:
+                            break
+                        continue
+                    if future not in results:
+                        try:
+                            results[future] = future.result()
+                        except Exception as e:
+                            logging.error(f"AI provider call failed: {e}")
+                            results[future] = None
+                    if results[future]:
+                        return results[future]
+                
+                if not pending:
+                    return None
+                now = time.monotonic()
+                if now >= deadline:
+                    logging.warning(f"No AI provider responded within {timeout}s")
+                    return None
+                _, pending = wait(pending, timeout=(grace_end if now < grace_end else deadline) - now,
+                                  return_when=FIRST_COMPLETED)
+        finally:
+            # Calls already in flight finish in the background; their results are discarded
+            for future in pending:
+                future.cancel()
+    
     def _use_gemini(self, prompt: str, max_length: int) -> Optional[str]:
         """Use Google Gemini API for text generation"""
         try:
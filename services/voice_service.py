@@ -1,12 +1,17 @@
+import atexit
 import pyttsx3
 import logging
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 
 class VoiceService:
     def __init__(self):
         self.engine = pyttsx3.init()
         self.setup_voice()
         
+        # One worker owns the engine, so utterances play in order and never overlap
+        self._tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts')
+        atexit.register(self._tts_executor.shutdown, wait=False, cancel_futures=True)
+        
     def setup_voice(self):
         """Configure voice settings"""
         try:
@@ -32,14 +37,8 @@ class VoiceService:
     def speak(self, text):
         """Convert text to speech"""
         try:
-            def _speak():
-                self.engine.say(text)
-                self.engine.runAndWait()
-            
-            # Run speech in separate thread to avoid blocking
-            thread = Thread(target=_speak)
-            thread.daemon = True
-            thread.start()
+            # Queue speech on the TTS worker to avoid blocking the caller
+            self._tts_executor.submit(self._speak, text)
             
             logging.info(f"Speaking: {text}")
             return True
@@ -48,6 +47,14 @@ class VoiceService:
             logging.error(f"Error in text-to-speech: {e}")
             return False
     
+    def _speak(self, text):
+        """Run on the TTS worker thread"""
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        except Exception as e:
+            logging.error(f"Error in text-to-speech: {e}")
+    
     def get_voice_info(self):
         """Get current voice information"""
         try: